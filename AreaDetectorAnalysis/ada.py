@@ -19,8 +19,25 @@ from PyQt5.QtWidgets import *
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.patches import Rectangle
 
-from source.areaData import AreaData
+from source.areaData import AreaData, ValidataionError
+from source.batchIntegration import INTEGRALS_DTYPE, integrateStack, integrateStackSurface
+from source.correctionFiles import loadBadPixels, loadEfficiency
+from source.corrections import FrameCorrections
+from source.directoryWatcher import DirectoryWatcher
+from source.frameCache import FrameCache
+from source.multiRoi import MultiRoi
+from source.framePrefetcher import FramePrefetcher
+from source.hotPixels import HotPixelDetector
+from source.pixelMask import PixelMask, detectorMask
+from source.roiTracker import trackRois
+from source.runningBackground import RunningBackground, SubtractedFrames
+from source.scanContainer import ScanContainer, convertScan, isContainer
+from source.scanCube import ScanCube
+from source.scanIndex import firstFrame, frameRows, indexImageDirectory, missingFrames
+from source.sparseFrame import SparseFrame, compactFrame
+from source.specIndex import findSpecFiles
 from source.specReader import ReadSpec
+from source.summedAreaTable import SummedAreaTable
 
 # ---------------------------------------------------------------------------------------------------------------------#
 class RedirectText(QObject):
@@ -32,6 +49,20 @@ class RedirectText(QObject):
         self.out.insertPlainText(string)
 
 
+class CorrectedFrames(object):
+    """Images of the open scan read through AreaDetectorAnalysisWindow.loadCorrectedFrame when they are indexed, so
+    that batch integration holds only a chunk of the corrected images in memory.
+    """
+    def __init__(self, window):
+        self.window = window
+
+    def __len__(self):
+        return len(self.window.fileList)
+
+    def __getitem__(self, i):
+        return self.window.loadCorrectedFrame(i)
+
+
 class AreaDetectorAnalysisWindow(QMainWindow):
     """Main window class"""
     def __init__(self, parent=None):
@@ -48,16 +79,35 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         self.ControlDockWidget()
 
         self.fileList = []
+        self.frameRows = []
+        self.firstFrame = None
         self.yPixelData = []
         self.xPixelData = []
         self.imgIndx = -1
         self.is_metadata_read = False
         self.imgArray = np.array(0)
+        self.imgSat = None
+        self.pixelMask = None
+        self.imgVariance = None
+        self.scanCube = None
+        self.prefetcher = None
+        self.frameCache = FrameCache()
+        self.correctionVersion = 0
+        self.corrections = None
+        self.compiledSettings = None
+        self.maskShapes = []  # ('rectangle', roi) or ('polygon', vertices), in detector pixels
+        self.savedRois = []  # (name, peak area, background area), in detector pixels
+        self.frameMask = None
+        self.watcher = None
+        self.watchTimer = QTimer(self)
+        self.watchTimer.timeout.connect(self.OnWatchTimer)
+        self.liveIntegrals = []
         self.savedatafile = None
         self.bad_pixels_on = False
         self.bad_pixels = []
         self.replacing_pixels = []
         self.efficiency_on = False
+        self.background = None
         self.mouse1_is_pressed = False
         self.dir = None
 
@@ -123,6 +173,7 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         print("AreaDetectorAnalysis: " + time.ctime())
 
         self.detectorDialog.exec_()
+        self.binning = self.detectorDialog.getBinning()
 
     def ControlDockWidget(self):
         """Dock widget on the right side that contains the controls and the spec file info for
@@ -164,6 +215,10 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         self.sc_pln_order2 = QSpinBox()
         self.sc_pln_order2.setRange(1, 5)
         self.sc_pln_order2.setValue(1)
+        self.sc_surface_order = QSpinBox()
+        self.sc_surface_order.setRange(0, 5)
+        self.sc_surface_order.setSpecialValueText("Off")
+        self.sc_surface_order.setToolTip("Order of the polynomial background surface of the exported scan integrals.")
         spacer = QFrame()
         spacer.setFrameShape(QFrame.HLine)
         spacer1 = QFrame()
@@ -319,8 +374,12 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         hBox_pln2 = QHBoxLayout()
         hBox_pln2.addWidget(QLabel("Background Fit Order 2:"))
         hBox_pln2.addWidget(self.sc_pln_order2)
+        hBox_pln3 = QHBoxLayout()
+        hBox_pln3.addWidget(QLabel("Background Surface Order:"))
+        hBox_pln3.addWidget(self.sc_surface_order)
         vBox_pln.addLayout(hBox_pln1)
         vBox_pln.addLayout(hBox_pln2)
+        vBox_pln.addLayout(hBox_pln3)
         vBox_pln.addWidget(spacer4)
 
         self.saveAndNextBtn = QPushButton("Save and Next")
@@ -372,6 +431,7 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         self.optionsMenu = self.mainMenu.addMenu("Options")
         self.badPixelsMenu = self.optionsMenu.addMenu("Bad Pixels")
         self.flatfieldMenu = self.optionsMenu.addMenu("Flatfield Correction")
+        self.backgroundMenu = self.optionsMenu.addMenu("Scan Background")
         self.setMenuBar(self.mainMenu)
 
         self.statusBar = QStatusBar()
@@ -384,14 +444,33 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         self.fileMenu.addAction(self.saveAction)
         self.fileMenu.addAction(self.saveAsAction)
         self.fileMenu.addAction(self.saveAndNextAction)
+        self.fileMenu.addAction(self.convertScanAction)
         self.exportMenu = self.fileMenu.addMenu("Export")
         self.fileMenu.addSeparator()
         self.fileMenu.addAction(self.exitAction)
         self.exportMenu.addAction(self.pixelDataAction)
+        self.exportMenu.addAction(self.scanIntegralsAction)
+        self.exportMenu.addAction(self.liveIntegralsAction)
+        self.exportMenu.addAction(self.multiRoiIntegralsAction)
         self.badPixelsMenu.addAction(self.badPixelsOnAction)
         self.badPixelsMenu.addAction(self.badPixelsOffAction)
+        self.badPixelsMenu.addAction(self.findHotPixelsAction)
         self.flatfieldMenu.addAction(self.flatfieldOnAction)
-        self.flatfieldMenu.addAction(self.badPixelsOffAction)
+        self.flatfieldMenu.addAction(self.flatfieldOffAction)
+        self.backgroundMenu.addAction(self.backgroundMeanAction)
+        self.backgroundMenu.addAction(self.backgroundMedianAction)
+        self.backgroundMenu.addAction(self.backgroundOffAction)
+        self.optionsMenu.addAction(self.frameCacheAction)
+        self.optionsMenu.addAction(self.watchDirAction)
+        self.optionsMenu.addAction(self.trackPeakAction)
+        self.optionsMenu.addAction(self.maskGapsAction)
+        self.maskShapesMenu = self.optionsMenu.addMenu("Mask Shapes")
+        self.maskShapesMenu.addAction(self.maskRectangleAction)
+        self.maskShapesMenu.addAction(self.maskPolygonAction)
+        self.maskShapesMenu.addAction(self.clearMaskShapesAction)
+        self.savedRoisMenu = self.optionsMenu.addMenu("Saved ROIs")
+        self.savedRoisMenu.addAction(self.saveRoiAction)
+        self.savedRoisMenu.addAction(self.clearSavedRoisAction)
 
 
     def createActions(self):
@@ -418,6 +497,10 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         self.saveAndNextAction.setStatusTip("Save the result and go to the next image.")
         self.saveAndNextAction.triggered.connect(self.OnSaveNext)
 
+        self.convertScanAction = QAction("Convert Scan to HDF5", self)
+        self.convertScanAction.setStatusTip("Pack the images and spec columns of the scan into one HDF5 file.")
+        self.convertScanAction.triggered.connect(self.OnConvertScan)
+
         self.exitAction = QAction("Exit", self)
         self.exitAction.setStatusTip("Exits the program.")
         self.exitAction.triggered.connect(self.OnExit)
@@ -426,6 +509,18 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         self.pixelDataAction.setStatusTip("Exports file with pixel data.")
         self.pixelDataAction.triggered.connect(self.PixelDataDialog)
 
+        self.scanIntegralsAction = QAction("Scan Integrals", self)
+        self.scanIntegralsAction.setStatusTip("Exports the integrals of every image with the current ROI.")
+        self.scanIntegralsAction.triggered.connect(self.OnExportScanIntegrals)
+
+        self.liveIntegralsAction = QAction("Live Integrals", self)
+        self.liveIntegralsAction.setStatusTip("Exports the integrals of the images added while watching the directory.")
+        self.liveIntegralsAction.triggered.connect(self.OnExportLiveIntegrals)
+
+        self.multiRoiIntegralsAction = QAction("Saved ROI Integrals", self)
+        self.multiRoiIntegralsAction.setStatusTip("Exports the area integrals of every image with each saved ROI.")
+        self.multiRoiIntegralsAction.triggered.connect(self.OnExportMultiRoiIntegrals)
+
         self.badPixelsOnAction = QAction("On", self)
         self.badPixelsOnAction.setStatusTip("Toggle on, bad pixel correction.")
         self.badPixelsOnAction.triggered.connect(self.OnBadPixelCorrection)
@@ -434,26 +529,88 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         self.badPixelsOffAction.setStatusTip("Toggle off, bad pixel correction.")
         self.badPixelsOffAction.triggered.connect(self.OffBadPixelCorrection)
 
+        self.findHotPixelsAction = QAction("Find Hot Pixels", self)
+        self.findHotPixelsAction.setStatusTip("Finds the pixels that are bright in every image of the scan and replaces "
+                                              "them.")
+        self.findHotPixelsAction.triggered.connect(self.OnFindHotPixels)
+
         self.flatfieldOnAction = QAction("On", self)
         self.flatfieldOnAction.setStatusTip("Toggle on, pixel by pixel efficiency correction")
         self.flatfieldOnAction.triggered.connect(self.OnFlatfieldCorrection)
 
-        self.flatfieldOffAction = QAction("On", self)
+        self.flatfieldOffAction = QAction("Off", self)
         self.flatfieldOffAction.setStatusTip("Toggle off, pixel by pixel efficiency correction")
         self.flatfieldOffAction.triggered.connect(self.OffFlatfieldCorrection)
 
+        self.backgroundMeanAction = QAction("Mean", self)
+        self.backgroundMeanAction.setStatusTip("Subtract the mean of every pixel over the scan from the images.")
+        self.backgroundMeanAction.triggered.connect(self.OnScanBackgroundMean)
+
+        self.backgroundMedianAction = QAction("Median", self)
+        self.backgroundMedianAction.setStatusTip("Subtract the median of every pixel over the scan from the images.")
+        self.backgroundMedianAction.triggered.connect(self.OnScanBackgroundMedian)
+
+        self.backgroundOffAction = QAction("Off", self)
+        self.backgroundOffAction.setStatusTip("Toggle off, scan background subtraction.")
+        self.backgroundOffAction.triggered.connect(self.OffScanBackground)
+
+        self.frameCacheAction = QAction("Frame Cache Size", self)
+        self.frameCacheAction.setStatusTip("Set the memory used to keep images that were already loaded.")
+        self.frameCacheAction.triggered.connect(self.OnFrameCacheSize)
+
+        self.watchDirAction = QAction("Watch Directory", self)
+        self.watchDirAction.setStatusTip("Load and integrate new images while the scan is running.")
+        self.watchDirAction.setCheckable(True)
+        self.watchDirAction.toggled.connect(self.OnWatchDirectory)
+
+        self.trackPeakAction = QAction("Track Peak", self)
+        self.trackPeakAction.setStatusTip("Move the peak and background areas with the peak when exporting the scan "
+                                          "integrals.")
+        self.trackPeakAction.setCheckable(True)
+
+        self.maskGapsAction = QAction("Mask Module Gaps", self)
+        self.maskGapsAction.setStatusTip("Leave the gap and dead pixels (negative values) out of the integrals.")
+        self.maskGapsAction.setCheckable(True)
+        self.maskGapsAction.setChecked(True)
+        self.maskGapsAction.toggled.connect(self.OnMaskGaps)
+
+        self.maskRectangleAction = QAction("Add Rectangle", self)
+        self.maskRectangleAction.setStatusTip("Leave a rectangle of pixels out of the integrals.")
+        self.maskRectangleAction.triggered.connect(self.OnAddMaskRectangle)
+
+        self.maskPolygonAction = QAction("Add Polygon", self)
+        self.maskPolygonAction.setStatusTip("Leave the pixels inside a polygon out of the integrals.")
+        self.maskPolygonAction.triggered.connect(self.OnAddMaskPolygon)
+
+        self.clearMaskShapesAction = QAction("Clear Shapes", self)
+        self.clearMaskShapesAction.setStatusTip("Stop masking the rectangles and polygons added.")
+        self.clearMaskShapesAction.triggered.connect(self.OnClearMaskShapes)
+
+        self.saveRoiAction = QAction("Save Current ROI", self)
+        self.saveRoiAction.setStatusTip("Keep the peak and background areas to export them with the other saved ROIs.")
+        self.saveRoiAction.triggered.connect(self.OnSaveRoi)
+
+        self.clearSavedRoisAction = QAction("Clear Saved ROIs", self)
+        self.clearSavedRoisAction.setStatusTip("Forget the saved peak and background areas.")
+        self.clearSavedRoisAction.triggered.connect(self.OnClearSavedRois)
+
     def OnOpenWorkDir(self):
         """This method opens the the spec file and the folder with the images.
         """
         try:
             self.fileList = []
             self.imgList = []
+            self.frameRows = []
+            self.background = None
+            self.closeScan()
+            self.watchDirAction.setChecked(False)
 
 
             self.dir = QFileDialog.getExistingDirectory(caption="Choose work directory")
 
             if os.path.isdir(self.dir):
                 items = os.listdir(self.dir)
+                containerFile = None
 
                 for item in items:
                     if self.dir.find("/") == 0:
@@ -462,18 +619,38 @@ class AreaDetectorAnalysisWindow(QMainWindow):
                         path = self.dir + '\\' + item
                     if os.path.isdir(path):
                         imgDir = path
-                    elif os.path.isfile(path):
-                        specFile = path
-
-
-                images = os.listdir(imgDir)
-                for img in images:
-                    self.fileListBox.addItem(img)
-                    self.imgList.append(img)
-                    if self.dir.find("/") == 0:
-                        self.fileList.append(imgDir + '/' + img)
-                    elif self.dir.find("\\") == 0:
-                        self.fileList.append(imgDir + '\\' + img)
+                    elif isContainer(path):
+                        containerFile = path
+
+                specFiles = findSpecFiles(self.dir)
+                specFile = specFiles[0]
+                if len(specFiles) > 1:
+                    print ("Several spec files in the work directory, reading " + os.path.basename(specFile))
+
+                if containerFile is not None:
+                    # A scan converted to HDF5 replaces the images folder
+                    self.scanCube = ScanContainer(containerFile)
+                    self.fileList = self.scanCube.fileList
+                    self.imgList = self.scanCube.imageNames
+                    self.fileListBox.addItems(self.imgList)
+                    imgDir = os.path.splitext(containerFile)[0]
+                    self.prefetcher = FramePrefetcher(self.scanCube, cache=self.frameCache)
+                else:
+                    frameTable = indexImageDirectory(imgDir)
+                    self.fileList = list(frameTable['path'])
+                    self.imgList = [os.path.basename(path) for path in self.fileList]
+                    self.fileListBox.addItems(self.imgList)
+
+                    missing = missingFrames(frameTable)
+                    if len(missing) != 0:
+                        print ("Missing frames: " + ", ".join(str(n) for n in missing))
+
+                    try:
+                        self.scanCube = ScanCube(self.fileList)
+                        self.prefetcher = FramePrefetcher(self.scanCube, cache=self.frameCache)
+                    except ValueError as ex:
+                        print (ex)
+                        self.scanCube = None
 
                 self.workDirOpen = True
                 print (len(self.imgList))
@@ -481,16 +658,103 @@ class AreaDetectorAnalysisWindow(QMainWindow):
                 print ('Reading spec file')
                 self.readSpec.loadSpec(specFile, imgDir)
                 self.readSpec.getSpecHeaderO(specFile)
+                self.firstFrame = firstFrame(self.imgList)
+                self.frameRows = frameRows(self.imgList, self.readSpec.rowCount(), self.firstFrame)
         except:
             QMessageBox.warning(self, "Error", "Please make sure the work directory follows the correct format.\n\n"
-                                "Directory should contain:\n\n" "1. Folder with images\n2. Spec file"
+                                "Directory should contain:\n\n" "1. Folder with images, or the scan converted to HDF5\n"
+                                "2. Spec file"
                                 "\n\nNote: The images folder should be named the number of the scan. For example 64.")
             self.fileListBox.clear()
             self.fileList = []
             self.imgList = []
+            self.frameRows = []
+            self.closeScan()
 
 
 
+    def OnWatchDirectory(self, checked):
+        """Starts or stops watching the images folder of the open scan for new images.
+        """
+        if checked == False:
+            self.watchTimer.stop()
+            self.watcher = None
+            return
+
+        if not isinstance(self.scanCube, ScanCube):
+            QMessageBox.warning(self, "Error", "Please open a work directory with an images folder first.")
+            self.watchDirAction.setChecked(False)
+            return
+
+        imgDir = os.path.dirname(self.fileList[0])
+        self.watcher = DirectoryWatcher(imgDir, self.fileList, os.path.getsize(self.fileList[0]))
+        self.liveIntegrals = []
+        self.watchTimer.start(1000)
+        print ("Watching " + imgDir)
+
+    def OnWatchTimer(self):
+        """Adds the images written since the last poll and integrates them with the current ROI.
+        """
+        try:
+            newFiles = self.watcher.poll()
+        except OSError as ex:
+            print (ex)
+            return
+
+        for path in newFiles:
+            name = os.path.basename(path)
+            self.fileList.append(path)
+            self.imgList.append(name)
+            self.frameRows.append(frameRows(self.imgList, self.readSpec.rowCount(), self.firstFrame)[-1])
+            self.fileListBox.addItem(name)
+
+            indx = len(self.fileList) - 1
+            integrals = self.integrateFrame(self.loadFrame(indx, dense=False), self.framePixelMask(indx))
+            if integrals is not None:
+                self.liveIntegrals.append((name,) + integrals)
+                self.statusBar.showMessage(name + " I=%g sigI=%g (%d live images)" % (integrals[:2] +
+                                                                                       (len(self.liveIntegrals),)))
+
+    def integrateFrame(self, img, pixelMask=None):
+        """Integrates an image with the ROI set in the controls.
+        :param img: 2D array or SparseFrame, from loadFrame
+        :param pixelMask: optional PixelMask of the image
+        :return: (I2d, sigI2d, I1d0, sigI1d0, I1d1, sigI1d1), or None if the ROI isn't set
+        """
+        droi, proi, broi = self.getRoiValues()
+        if (0 in proi) or (0 in broi):
+            return None
+        variance = self.background.errorVariance(img) if self.background is not None else None
+        try:
+            areadata = AreaData(img, *self.binnedRois(droi, proi, broi), pixelMask=pixelMask, variance=variance)
+        except ValidataionError:
+            return None
+        I2d, sigI2d = areadata.areaIntegral()
+        I1d1, sigI1d1 = areadata.lineIntegral(1, self.sc_pln_order2.value())[4:]
+        I1d0, sigI1d0 = areadata.lineIntegral(0, self.sc_pln_order1.value())[4:]
+        return I2d, sigI2d, I1d0, sigI1d0, I1d1, sigI1d1
+
+    def OnConvertScan(self):
+        """Writes the open scan into a chunked, compressed HDF5 file that can be opened instead of the images folder.
+        """
+        if not isinstance(self.scanCube, ScanCube):
+            QMessageBox.warning(self, "Error", "Please open a work directory with an images folder first.")
+            return
+
+        imgDir = os.path.dirname(self.fileList[0])
+        containerFile, containerFilter = QFileDialog.getSaveFileName(self, "Convert Scan", imgDir + ".h5",
+                                                                     "HDF5 (*.h5 *.nxs)")
+        if containerFile != "":
+            try:
+                specScan = self.readSpec.scans[self.readSpec.scan]
+            except AttributeError:
+                specScan = None
+            try:
+                convertScan(self.fileList, containerFile, specScan).close()
+                print ("Scan written to " + containerFile)
+            except (ImportError, IOError, ValueError) as ex:
+                QMessageBox.warning(self, "Error", "Unable to convert the scan.\n\nException: " + str(ex))
+
     def OnSaveAs(self):
         """Ask Jong what he wants to save.
         """
@@ -507,7 +771,7 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         print self.fileListBox.count()
         indx = self.imgIndx + 1
         print indx
-        if indx < len(self.imgArray):
+        if indx < len(self.fileList):
             self.fileListBox.setCurrentRow(indx)
             self.OnListSelected()
 
@@ -520,40 +784,317 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         """
         self.close()
 
+    def closeEvent(self, event):
+        self.watchTimer.stop()
+        self.closeScan()
+        event.accept()
+
+    def closeScan(self):
+        """Stops the background reading of the current scan and closes its files.
+        """
+        self.closePrefetcher()
+        if self.scanCube is not None:
+            self.scanCube.close()
+            self.scanCube = None
+
+    def closePrefetcher(self):
+        """Stops the background reading of the current scan.
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
+
     def OnBadPixelCorrection(self):
-        """Ask Jong what file is required for this.
+        """Loads a bad pixel file, one "x,y x,y" line per bad pixel followed by the pixel that replaces it.
         """
-        print "Not ready, yet"
+        badPixelFile, badPixelFilter = QFileDialog.getOpenFileName(self, "Open Bad Pixel File")
+        if badPixelFile == "":
+            return
+        try:
+            self.bad_pixels, self.replacing_pixels = loadBadPixels(badPixelFile)
+        except (IOError, OSError, ValueError) as e:
+            QMessageBox.warning(self, "Error", "Could not read the bad pixel file.\n" + str(e))
+            return
+        self.bad_pixels_on = True
+        self.correctionsChanged()
 
     def OffBadPixelCorrection(self):
         self.bad_pixels_on = False
+        self.correctionsChanged()
+
+    def OnFindHotPixels(self):
+        """Reads the scan once, frame by frame, to find the hot pixels and turns on their correction. The bad pixel
+        file can be saved to be used with other scans.
+        """
+        if len(self.fileList) == 0:
+            QMessageBox.warning(self, "Error", "Please open a scan first.")
+            return
+        self.statusBar.showMessage("Looking for hot pixels...")
+        detector = HotPixelDetector(self.loadRawFrame(0).shape, self.detectorDialog.getSaturation())
+        for i in range(len(self.fileList)):
+            detector.update(self.loadRawFrame(i))
+        self.statusBar.clearMessage()
+
+        self.bad_pixels, self.replacing_pixels = detector.replacements()
+        QMessageBox.information(self, "Hot Pixels", str(len(self.bad_pixels)) + " hot pixels found.")
+        if len(self.bad_pixels) == 0:
+            return
+        self.bad_pixels_on = True
+        self.correctionsChanged()
+
+        badPixelFile, badPixelFilter = QFileDialog.getSaveFileName(self, "Save Bad Pixel File", "", ".txt")
+        if badPixelFile != "":
+            detector.write(badPixelFile + badPixelFilter)
 
     def OnFlatfieldCorrection(self):
-        """ Ask Jong what file is needed here.
+        """Loads a flatfield image with the efficiency of every pixel, the images are divided by it.
         """
-        print "Not ready, yet"
+        efficiencyFile, efficiencyFilter = QFileDialog.getOpenFileName(self, "Open Flatfield Efficiency File")
+        if efficiencyFile == "":
+            return
+        try:
+            self.efficiencyarray = loadEfficiency(efficiencyFile)
+        except (IOError, OSError, ValueError) as e:
+            QMessageBox.warning(self, "Error", "Could not read the flatfield efficiency file.\n" + str(e))
+            return
+        self.efficiency_on = True
+        self.correctionsChanged()
 
     def OffFlatfieldCorrection(self):
         self.efficiency_on = False
+        self.correctionsChanged()
+
+    def OnScanBackgroundMean(self):
+        self.computeScanBackground('mean')
+
+    def OnScanBackgroundMedian(self):
+        self.computeScanBackground('median')
+
+    def OffScanBackground(self):
+        self.background = None
+        self.correctionsChanged()
+
+    def computeScanBackground(self, method):
+        """Reads the scan once, frame by frame, to build the background subtracted from the images.
+        :param method: 'mean' or 'median'
+        """
+        if len(self.fileList) == 0:
+            QMessageBox.warning(self, "Error", "Please open a scan first.")
+            return
+        self.background = None
+        self.correctionsChanged()
+        self.statusBar.showMessage("Computing the scan background...")
+        background = RunningBackground(self.loadCorrectedFrame(0).shape, method)
+        for i in range(len(self.fileList)):
+            background.update(self.loadCorrectedFrame(i))
+        self.statusBar.clearMessage()
+        self.background = background
+        self.correctionsChanged()
+
+    def correctionsChanged(self):
+        """Stops using the images corrected with the previous settings and shows the current one again.
+        """
+        self.correctionVersion += 1
+        if 0 <= self.imgIndx < len(self.fileList):
+            self.OnListSelected()
 
     def OnListSelected(self):
         """Opens the image double clicked from the QListWidget.
         """
         self.imgIndx = self.fileListBox.currentRow()
-        self.curimg = Image.open(self.fileList[self.imgIndx])
-        self.imgArray = np.array(self.curimg)
-
-        self.readSpec.getSpecData(self.imgIndx)
+        self.imgArray = self.loadFrame(self.imgIndx)
+        self.imgVariance = self.background.errorVariance(self.imgArray) if self.background is not None else None
+        self.pixelMask = self.framePixelMask(self.imgIndx)
+        self.imgSat = SummedAreaTable(self.imgArray, self.pixelMask)
+
+        if self.prefetcher is not None:
+            self.prefetcher.prefetch(self.imgIndx)
+
+        row = self.frameRows[self.imgIndx]
+        if row == -1:
+            self.statusBar.showMessage("No spec data point for " + self.imgList[self.imgIndx], 3000)
+        self.readSpec.getSpecData(row)
+        self.RedrawImage()
 
+    def loadFrame(self, indx, dense=True):
+        """Gets an image with the flatfield and bad pixel corrections applied, binned, then with the scan background
+        subtracted.
+        :param indx: index of the image in self.fileList
+        :param dense: False to get the image as it is cached, a SparseFrame when few pixels counted
+        :return: read only 2D array, or SparseFrame. With a scan background, a float64 array with negative pixels
+        where the image is below the background.
+        """
+        frame = self.loadCorrectedFrame(indx, dense)
+        if self.background is not None:
+            frame = self.background.subtract(self.expandFrame(frame))
+            frame.flags.writeable = False
+        return frame
+
+    def loadCorrectedFrame(self, indx, dense=True):
+        """Gets an image with the flatfield and bad pixel corrections applied, then binned, from the frame cache when
+        it was already corrected with the current settings.
+        :param indx: index of the image in self.fileList
+        :param dense: False to get the image as it is cached, a SparseFrame when few pixels counted
+        :return: read only 2D array, or SparseFrame
+        """
+        corrections = self.correctionSettings()
+        if corrections is None:
+            return self.loadRawFrame(indx, dense)
+
+        path = self.fileList[indx]
+        key = self.frameCache.key(path, corrections,
+                                  mtime=self.scanCube.mtime(path) if self.scanCube is not None else None)
+        frame = self.frameCache.get(key)
+        if frame is None:
+            frame = self.loadRawFrame(indx)
+            if self.efficiency_on == True or self.bad_pixels_on == True:
+                frame = self.frameCorrections(frame.shape).apply(frame)
+            frame = self.frameCache.put(key, compactFrame(self.binning.apply(frame)))
+        return self.expandFrame(frame) if dense else frame
+
+    def loadRawFrame(self, indx, dense=True):
+        """Gets an uncorrected image from the frame cache, the prefetcher or the disk, in that order.
+        :param indx: index of the image in self.fileList
+        :param dense: False to get the image as it is cached, a SparseFrame when few pixels counted
+        :return: read only 2D array, or SparseFrame
+        """
+        path = self.fileList[indx]
+        key = self.frameCache.key(path, mtime=self.scanCube.mtime(path) if self.scanCube is not None else None)
+        frame = self.frameCache.get(key)
+        if frame is None:
+            if self.prefetcher is not None:
+                frame = self.prefetcher.get(indx)
+            if frame is None:
+                if self.scanCube is not None:
+                    frame = self.scanCube.read(indx)
+                else:
+                    frame = np.array(Image.open(self.fileList[indx]))
+            frame = self.frameCache.put(key, compactFrame(frame))
+        return self.expandFrame(frame) if dense else frame
+
+    def expandFrame(self, frame):
+        """Expands an image kept as a SparseFrame.
+        :param frame: 2D array or SparseFrame
+        :return: read only 2D array
+        """
+        if isinstance(frame, SparseFrame):
+            frame = frame.toDense()
+            frame.flags.writeable = False
+        return frame
+
+    def frameCorrections(self, shape):
+        """Compiles the current corrections, again only when they changed.
+        :param shape: shape of the images
+        :return: FrameCorrections
+        """
+        settings = (self.correctionSettings(), shape)
+        if self.corrections is None or self.compiledSettings != settings:
+            badPixels = self.bad_pixels_on == True
+            self.corrections = FrameCorrections(shape, self.bad_pixels if badPixels else (),
+                                                self.replacing_pixels if badPixels else (),
+                                                self.efficiencyarray if self.efficiency_on == True else None)
+            self.compiledSettings = settings
+        return self.corrections
+
+    def framePixelMask(self, indx):
+        """Mask of the gap and dead pixels, shared by all the images of the detector, with the pixels the flatfield
+        has no efficiency for and the shapes added from the Mask Shapes menu. The image is only read the first time
+        its mask is asked for.
+        :param indx: index of the image in self.fileList
+        :return: PixelMask of the binned images, or None when nothing is masked
+        """
+        pixelMask = None
+        if self.maskGapsAction.isChecked():
+            path = self.fileList[indx]
+            mtime = self.scanCube.mtime(path) if self.scanCube is not None else os.path.getmtime(path)
+            pixelMask = detectorMask(lambda: self.loadRawFrame(indx), (path, mtime))
+        corrections = None
         if self.efficiency_on == True:
-            self.imgArray = self.imarray / self.efficiencyarray
+            corrections = self.frameCorrections(np.shape(self.efficiencyarray))
+
+        settings = (pixelMask, corrections, tuple(self.maskShapes), (self.binning.columns, self.binning.rows))
+        if self.frameMask is None or self.frameMask[0] != settings:
+            deadPixels = corrections.masked if corrections is not None else None
+            if len(self.maskShapes) != 0 or deadPixels is not None:
+                if pixelMask is None:
+                    pixelMask = PixelMask(self.scanCube.frameShape if self.scanCube is not None else
+                                          self.loadRawFrame(indx, dense=False).shape)
+                else:
+                    pixelMask = pixelMask.copy()
+                if deadPixels is not None:
+                    pixelMask.masked |= deadPixels
+                for kind, shape in self.maskShapes:
+                    if kind == 'rectangle':
+                        pixelMask.addRectangle(shape)
+                    else:
+                        pixelMask.addPolygon(shape)
+            if pixelMask is not None and not self.binning.isIdentity:
+                pixelMask = self.binning.mask(pixelMask)
+            self.frameMask = (settings, pixelMask)
+        return self.frameMask[1]
+
+    def OnMaskGaps(self, checked):
+        if 0 <= self.imgIndx < len(self.fileList):
+            self.OnListSelected()
 
-        if self.bad_pixels_on == True:
-            for i in range(len(self.bad_pixels)):
-                self.imgArray[self.bad_pixels[i][1], self.bad_pixels[i][0]] = \
-                    self.imgArray[self.replacing_pixels[i][1], self.replacing_pixels[i][0]]
+    def OnAddMaskRectangle(self):
+        """Asks the user for a rectangle to mask, the peak area by default.
+        """
+        droi, proi, broi = self.getRoiValues()
+        text, ok = QInputDialog.getText(self, "Mask Rectangle", "x center, y center, x width, y width (pixels):",
+                                        text=", ".join("%g" % v for v in proi))
+        if ok:
+            values = self.parseMaskValues(text)
+            if values is None or len(values) != 4 or min(values[2:]) <= 0:
+                QMessageBox.warning(self, "Error", "Please enter the center and the widths of the rectangle.")
+                return
+            self.maskShapes.append(('rectangle', values))
+            self.OnMaskGaps(True)
+
+    def OnAddMaskPolygon(self):
+        """Asks the user for the vertices of a polygon to mask.
+        """
+        text, ok = QInputDialog.getText(self, "Mask Polygon", "Vertices x1, y1, x2, y2, ... (pixels):")
+        if ok:
+            values = self.parseMaskValues(text)
+            if values is None or len(values) < 6 or len(values) % 2 != 0:
+                QMessageBox.warning(self, "Error", "Please enter the x, y pixels of at least three vertices.")
+                return
+            self.maskShapes.append(('polygon', tuple(zip(values[::2], values[1::2]))))
+            self.OnMaskGaps(True)
+
+    def OnClearMaskShapes(self):
+        """Removes the rectangles and polygons added to the mask.
+        """
+        self.maskShapes = []
+        self.OnMaskGaps(True)
 
-        self.RedrawImage()
+    def parseMaskValues(self, text):
+        """
+        :param text: numbers separated by commas or spaces
+        :return: tuple of float, or None if the text has something else
+        """
+        try:
+            return tuple(float(v) for v in text.replace(",", " ").split())
+        except ValueError:
+            return None
+
+    def correctionSettings(self):
+        """Describes the corrections applied to the images, for the frame cache keys.
+        :return: tuple, or None when the images are not corrected
+        """
+        if self.efficiency_on == True or self.bad_pixels_on == True or not self.binning.isIdentity:
+            return (self.efficiency_on, self.bad_pixels_on, (self.binning.columns, self.binning.rows),
+                    self.correctionVersion)
+        return None
+
+    def OnFrameCacheSize(self):
+        """Asks the user for the memory budget of the frame cache.
+        """
+        size, ok = QInputDialog.getInt(self, "Frame Cache", "Memory for cached images (MB):",
+                                       self.frameCache.maxBytes // 1024 ** 2, 0, 1024 ** 2)
+        if ok:
+            self.frameCache.setBudget(size * 1024 ** 2)
 
     def RedrawImage(self):
         """Redraws the image.
@@ -561,7 +1102,7 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         try:
             if self.imgArray.any():
                 self.resetRoiRange()
-                ih, iw = self.imgArray.shape
+                ih, iw = self.detectorShape()
                 droi, proi, broi = self.getRoiValues()
 
                 if droi == (0, 0, 0, 0):
@@ -578,6 +1119,7 @@ class AreaDetectorAnalysisWindow(QMainWindow):
                     vmax = bins[-1]
                     dxlim = [droi[0] - droi[2] / 2. - 0.5, droi[0] + droi[2] / 2. + 0.5]
                     dylim = [droi[1] + droi[3] / 2. - 0.5, droi[1] - droi[3] / 2. + 0.5]
+                    proi, broi = self.integratedRoi(proi), self.integratedRoi(broi)  # the pixels integrated
                     px = [proi[0] - proi[2] / 2., proi[0] + proi[2] / 2., proi[0] + proi[2] / 2., proi[0] - proi[2] / 2.,
                           proi[0] - proi[2] / 2.]
                     py = [proi[1] - proi[3] / 2., proi[1] - proi[3] / 2., proi[1] + proi[3] / 2., proi[1] + proi[3] / 2.,
@@ -588,13 +1130,16 @@ class AreaDetectorAnalysisWindow(QMainWindow):
                           broi[1] - broi[3] / 2.]
                     self.figure1.clear()
                     ax = self.figure1.add_subplot(111)
-                    ax.imshow(self.imgArray, interpolation='none', vmin=vmin, vmax=vmax)
+                    # binned pixels are drawn over their blocks, the axes stay in detector pixels
+                    ax.imshow(self.imgArray, interpolation='none', vmin=vmin, vmax=vmax,
+                              extent=(-0.5, iw - 0.5, ih - 0.5, -0.5))
                     ax.set_xlim(dxlim)
                     ax.set_ylim(dylim)
                     ax.plot(px, py, 'y-', linewidth=1.0)
                     ax.plot(bx, by, 'g-', linewidth=1.0)
                     self.canvas1.draw()
 
+                    droi, proi, broi = self.getRoiValues()
                     if (0 in proi) or (0 in broi):
                         pass
                     else:
@@ -641,10 +1186,8 @@ class AreaDetectorAnalysisWindow(QMainWindow):
             self.fileListBox.takeItem(indx)
             self.fileList.remove(self.fileList[indx])
             self.imgList.pop(indx)
-
-            for n in self.readSpec.specInfoValue:
-                if isinstance(n, list):
-                    n.pop(indx)
+            # The remaining images keep their spec rows
+            self.frameRows.pop(indx)
 
 
     def OnRemoveAllFiles(self):
@@ -653,12 +1196,16 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         if len(self.fileList) != 0:
             self.fileListBox.clear()
             self.fileList = []
+            self.frameRows = []
+            self.background = None
+            self.closeScan()
+            self.watchDirAction.setChecked(False)
 
     def OnResetDataROI(self):
         """Resets the roi to its original value.
         """
         if self.imgArray.any():
-            ih, iw = self.imgArray.shape
+            ih, iw = self.detectorShape()
             print ih, iw
             self.sc_dxc.setRange(0, iw)
             self.sc_dxc.setValue(iw / 2)
@@ -681,7 +1228,7 @@ class AreaDetectorAnalysisWindow(QMainWindow):
     def resetRoiRange(self):
         """Resets the roi ranges to its original size.
         """
-        ih, iw = self.imgArray.shape
+        ih, iw = self.detectorShape()
         self.sc_dxc.setRange(0, iw)
         self.sc_dyc.setRange(0, ih)
         self.sc_dxw.setRange(0, iw)
@@ -718,10 +1265,13 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         self.yPixelData = []
         self.xPixelData = []
         self.imageName = self.imgList[self.imgIndx]
-        areadata = AreaData(lum_img, droi, proi, broi)  #
+        areadata = AreaData(lum_img, *self.binnedRois(droi, proi, broi), sat=self.imgSat, pixelMask=self.pixelMask,
+                            variance=self.imgVariance)
         self.I2d, self.sigI2d = areadata.areaIntegral()
         xb2, yb2, yb2_err, yb2_pln, self.I1d1, self.sigI1d1 = areadata.lineIntegral(1, self.sc_pln_order2.value())
         xb3, yb3, yb3_err, yb3_pln, self.I1d0, self.sigI1d0 = areadata.lineIntegral(0, self.sc_pln_order1.value())
+        xb2 = self.binning.pixelPositions(xb2, 1)
+        xb3 = self.binning.pixelPositions(xb3, 0)
         # plot in canvas2
         self.figure2.clear()
         self.figure2.add_subplot(111)
@@ -749,6 +1299,31 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         self.figure3.tight_layout()
         self.canvas3.draw()
 
+    def detectorShape(self):
+        """Size of the shown image in detector pixels, the pixels the ROI controls are set in.
+        :return: (rows, columns)
+        """
+        ih, iw = self.imgArray.shape
+        return ih * self.binning.rows, iw * self.binning.columns
+
+    def binnedRois(self, *rois):
+        """Converts rois from the controls, in detector pixels, to the pixels of the loaded images.
+        :param rois: rois in detector pixels
+        :return: tuple of rois in binned pixels
+        """
+        if self.binning.isIdentity:
+            return rois
+        return tuple(self.binning.roi(roi) for roi in rois)
+
+    def integratedRoi(self, roi):
+        """Detector pixels integrated for a roi, those of the blocks it covers when the images are binned.
+        :param roi: roi in detector pixels
+        :return: roi in detector pixels
+        """
+        if self.binning.isIdentity:
+            return roi
+        return self.binning.unbinRoi(self.binning.roi(roi))
+
     def getRoiValues(self):
         """Gets the roi values.
         """
@@ -772,7 +1347,7 @@ class AreaDetectorAnalysisWindow(QMainWindow):
         if self.imgArray.any():
             if event.inaxes:
                 ix, iy = event.xdata, event.ydata
-                iz = self.imgArray[np.int(round(iy)), np.int(round(ix))]
+                iz = self.imgArray[np.int(round(iy)) // self.binning.rows, np.int(round(ix)) // self.binning.columns]
                 self.setStatusTip("p=(" + str(int(round(ix))) + ', ' + str(int(round(iy))) + "), I=" + str(iz))
                 if self.mouse1_is_pressed == True:
                     xw = ix - self.mousex0
@@ -879,6 +1454,123 @@ class AreaDetectorAnalysisWindow(QMainWindow):
                     self.pixelDataDialog.close()
 
 
+    def OnExportScanIntegrals(self):
+        """Integrates every image of the scan with the current ROI and writes the results to a file.
+        """
+        droi, proi, broi = self.getRoiValues()
+        if len(self.fileList) == 0 or (0 in proi) or (0 in broi):
+            QMessageBox.warning(self, "Error", "Please open a scan and set the peak and background areas first.")
+            return
+
+        try:
+            frames = self.scanFrames()
+            tracked = self.trackPeakAction.isChecked()
+            droi, proi, broi = self.binnedRois(droi, proi, broi)
+            if tracked:
+                proi, broi, moments = trackRois(frames, proi, broi)
+            pixelMask = self.framePixelMask(0)
+            integrals = integrateStack(frames, proi, broi, self.sc_pln_order1.value(), self.sc_pln_order2.value(),
+                                       pixelMask=pixelMask, background=self.background)
+            surface = None
+            if self.sc_surface_order.value() > 0:
+                surface = integrateStackSurface(frames, proi, broi, self.sc_surface_order.value(),
+                                                pixelMask=pixelMask, background=self.background)
+        except ValidataionError:
+            return
+        except ValueError as ex:
+            QMessageBox.warning(self, "Error", str(ex))
+            return
+
+        reportFile, reportFileFilter = QFileDialog.getSaveFileName(self, "Save Scan Integrals", "", ".txt")
+        if reportFile != "":
+            reportFile += reportFileFilter
+            file = open(reportFile, "w")
+            file.write("#C " + os.path.dirname(self.fileList[0]) + "\n")
+            columns = list(integrals.dtype.names) + (["I2dSurface", "sigI2dSurface"] if surface is not None else []) + \
+                (["xPeak", "yPeak"] if tracked else [])
+            file.write("#H image " + " ".join(columns) + "\n")
+            for i, name in enumerate(self.imgList):
+                values = tuple(integrals[i]) + (tuple(surface[i]) if surface is not None else ())
+                if tracked:
+                    peak = proi[i] if self.binning.isIdentity else self.binning.unbinRoi(tuple(proi[i]))
+                    values += tuple(peak[:2])
+                file.write(name + " " + " ".join("{:.6g}".format(v) for v in values) + "\n")
+            file.close()
+
+    def scanFrames(self):
+        """Images of the open scan as batch integration reads them, corrected and with the scan background removed.
+        :return: ScanCube, ScanContainer, CorrectedFrames or SubtractedFrames
+        """
+        if self.correctionSettings() is None and self.scanCube is not None:
+            frames = self.scanCube
+        else:
+            frames = CorrectedFrames(self)
+        if self.background is not None:
+            frames = SubtractedFrames(frames, self.background)
+        return frames
+
+    def OnSaveRoi(self):
+        """Saves the peak and background areas set in the controls under a name.
+        """
+        droi, proi, broi = self.getRoiValues()
+        if (0 in proi) or (0 in broi):
+            QMessageBox.warning(self, "Error", "Please set the peak and background areas first.")
+            return
+        name, ok = QInputDialog.getText(self, "Save ROI", "Name:", text="roi%d" % (len(self.savedRois) + 1))
+        name = name.strip().replace(" ", "_")
+        if ok and name != "":
+            self.savedRois.append((name, proi, broi))
+            self.statusBar.showMessage("%d saved ROIs" % len(self.savedRois), 3000)
+
+    def OnClearSavedRois(self):
+        """Forgets the saved ROIs.
+        """
+        self.savedRois = []
+
+    def OnExportMultiRoiIntegrals(self):
+        """Integrates every image of the scan with each saved ROI and writes the results to a file, two columns per
+        ROI.
+        """
+        if len(self.fileList) == 0 or len(self.savedRois) == 0:
+            QMessageBox.warning(self, "Error", "Please open a scan and save the ROIs to integrate first.")
+            return
+
+        try:
+            multiRoi = MultiRoi([(name,) + self.binnedRois(proi, broi) for name, proi, broi in self.savedRois])
+            integrals = multiRoi.integrateStack(self.scanFrames(), pixelMask=self.framePixelMask(0),
+                                                background=self.background)
+        except ValidataionError:
+            return
+
+        reportFile, reportFileFilter = QFileDialog.getSaveFileName(self, "Save Saved ROI Integrals", "", ".txt")
+        if reportFile != "":
+            reportFile += reportFileFilter
+            file = open(reportFile, "w")
+            file.write("#C " + os.path.dirname(self.fileList[0]) + "\n")
+            file.write("#H image " + " ".join(name + "_I " + name + "_sigI" for name in multiRoi.names) + "\n")
+            for name, row in zip(self.imgList, integrals):
+                values = np.column_stack((row['I'], row['sigI'])).ravel()
+                file.write(name + " " + " ".join("{:.6g}".format(v) for v in values) + "\n")
+            file.close()
+
+    def OnExportLiveIntegrals(self):
+        """Writes the integrals of the images added by the directory watcher to a file, in the format of the scan
+        integrals.
+        """
+        if len(self.liveIntegrals) == 0:
+            QMessageBox.warning(self, "Error", "Please watch the directory with the ROI set until new images come in.")
+            return
+
+        reportFile, reportFileFilter = QFileDialog.getSaveFileName(self, "Save Live Integrals", "", ".txt")
+        if reportFile != "":
+            reportFile += reportFileFilter
+            file = open(reportFile, "w")
+            file.write("#C " + os.path.dirname(self.fileList[0]) + "\n")
+            file.write("#H image " + " ".join(INTEGRALS_DTYPE.names) + "\n")
+            for row in self.liveIntegrals:
+                file.write(row[0] + " " + " ".join("{:.6g}".format(v) for v in row[1:]) + "\n")
+            file.close()
+
     def PrintPixelReport(self):
         """Writes the information to the report.
         """
@@ -16,6 +16,8 @@ import matplotlib.pylab as plt
 from PIL import Image
 import numpy as np
 from scipy import interpolate
+from backgroundFit import fixedKnotSpline, polynomialBackground, polynomialSurface, splineKnots
+from sparseFrame import SparseFrame
 
 # ---------------------------------------------------------------------------------------------------------------------#
 
@@ -25,35 +27,156 @@ class ValidataionError(Exception):
         print("\nValidatiaonError has been raised. Check the Error message.")
 
 
+def roiIndices(roi):
+    """Index bounds of a roi.
+    :param roi: (x center, y center, x width, y width)
+    :return: [first column, last column + 1], [first row, last row + 1]
+    """
+    xc, yc, xw, yw = roi
+    return [int(round(xc - xw / 2)), int(round(xc + xw / 2)) + 1], [int(round(yc - yw / 2)), int(round(yc + yw / 2)) + 1]
+
+
+def checkRoi(proi, broi):
+    """Raises ValidataionError if the peak area isn't inside the background area."""
+    pxc, pyc, pxw, pyw = proi
+    bxc, byc, bxw, byw = broi
+    if pxc - pxw / 2 < bxc - bxw / 2 or pxc + pxw / 2 > bxc + bxw / 2 or pyc - pyw / 2 < byc - byw / 2 or pyc + pyw / 2 > byc + byw / 2:
+        raise ValidataionError("Vertices of peak area box must stay within Background area.")
+
+
+def outsidePeak(xb, xp):
+    """Mask of the background positions that are not in the peak area.
+    :param xb: consecutive positions of the background area
+    :param xp: consecutive positions of the peak area, inside xb
+    :return: boolean array, same length as xb
+    """
+    if len(xp) == 0:
+        return np.ones(len(xb), dtype=bool)
+    return (xb < xp[0]) | (xb > xp[-1])
+
+
+def backgroundPixels(proi, broi, mask=None):
+    """Pixels of the background area that are outside the peak area.
+    :param proi: peak area
+    :param broi: background area
+    :param mask: optional 2D boolean array over the background area, False for pixels that must not be used
+    :return: 2D boolean array over the background area
+    """
+    px, py = roiIndices(proi)
+    bx, by = roiIndices(broi)
+    keep = np.ones((by[1] - by[0], bx[1] - bx[0]), dtype=bool)
+    keep[py[0] - by[0]:py[1] - by[0], px[0] - bx[0]:px[1] - bx[0]] = False
+    if mask is not None:
+        keep &= mask
+    return keep
+
+
+def maskedSum(img, masked=None):
+    """Sum of the pixels that are not masked, without copying the image.
+    :param img: 2D array
+    :param masked: boolean array of the same shape, True for masked pixels, or None
+    :return: float
+    """
+    total = np.sum(img, dtype=np.float64)
+    if masked is not None:
+        total -= np.sum(img[masked], dtype=np.float64)
+    return float(total)
+
+
+def maskedProfile(img, masked, axis):
+    """Sums of the lines of an image, without the masked pixels.
+    :param img: 2D array
+    :param masked: boolean array of the same shape, True for masked pixels, or None
+    :param axis: axis along which the lines are summed
+    :return: float64 profile
+    """
+    yb = np.sum(img, axis, dtype=np.float64)
+    if masked is not None:
+        rows, cols = np.nonzero(masked)
+        yb -= np.bincount(cols if axis == 0 else rows, weights=img[rows, cols], minlength=len(yb))
+    return yb
+
+
+def maskedCount(masked):
+    """Number of masked pixels, 0 for no mask."""
+    return 0 if masked is None else np.count_nonzero(masked)
+
+
+def fillMaskedLines(yb, masked, axis):
+    """Scales the sums of lines with masked pixels to the full line length, as if the masked pixels had the mean of
+    the rest of their line.
+    :param yb: line sums of the unmasked pixels, one or many profiles
+    :param masked: boolean array the profiles were summed from, True for masked pixels
+    :param axis: axis along which the lines were summed
+    :return: profile, boolean array of the lines with at least one unmasked pixel
+    """
+    length = masked.shape[axis]
+    valid = length - np.count_nonzero(masked, axis)
+    measured = valid > 0
+    return np.where(measured, yb * (float(length) / np.maximum(valid, 1)), 0.0), measured
+
+
 class AreaData(object):
-    def __init__(self, lum_img, droi, proi, broi):
-        self.lum_img = np.array(lum_img)
-        dxc = droi[0]
-        dyc = droi[1]
-        dxw = droi[2]
-        dyw = droi[3]
-        pxc = proi[0]
-        pyc = proi[1]
-        pxw = proi[2]
-        pyw = proi[3]
-        bxc = broi[0]
-        byc = broi[1]
-        bxw = broi[2]
-        byw = broi[3]
-
-        if pxc - pxw / 2 < bxc - bxw / 2 or pxc + pxw / 2 > bxc + bxw / 2 or pyc - pyw / 2 < byc - byw / 2 or pyc + pyw / 2 > byc + byw / 2:
-            raise ValidataionError("Vertices of peak area box must stay within Background area.")
-            return
-
-        self.dx_ndx = [int(round(dxc - dxw / 2)), int(round(dxc + dxw / 2)) + 1]
-        self.dy_ndx = [int(round(dyc - dyw / 2)), int(round(dyc + dyw / 2)) + 1]
-        self.px_ndx = [int(round(pxc - pxw / 2)), int(round(pxc + pxw / 2)) + 1]
-        self.py_ndx = [int(round(pyc - pyw / 2)), int(round(pyc + pyw / 2)) + 1]
-        self.bx_ndx = [int(round(bxc - bxw / 2)), int(round(bxc + bxw / 2)) + 1]
-        self.by_ndx = [int(round(byc - byw / 2)), int(round(byc + byw / 2)) + 1]
-        self.peak_img = self.lum_img[self.py_ndx[0]:self.py_ndx[1],
-                        self.px_ndx[0]:self.px_ndx[1]]  # note y is rows, x is colums
-        self.back_img = self.lum_img[self.by_ndx[0]:self.by_ndx[1], self.bx_ndx[0]:self.bx_ndx[1]]
+    def __init__(self, lum_img, droi, proi, broi, sat=None, pixelMask=None, variance=None):
+        """
+        :param lum_img: 2D image, used without a copy and kept in its dtype (sums are accumulated in float64), or a
+        SparseFrame, integrated without expanding it except for the 2D integrals
+        :param droi: data roi (x center, y center, x width, y width)
+        :param proi: peak area, same format
+        :param broi: background area, same format
+        :param sat: optional SummedAreaTable of lum_img, makes areaIntegral independent of the roi size, built with
+        pixelMask when one is given
+        :param pixelMask: optional PixelMask, the masked pixels are left out of every integral
+        :param variance: optional 2D array with the variance of every pixel, for images that are not raw counts (a
+        subtracted scan background, RunningBackground.errorVariance). The errors are square roots of sums of it
+        instead of sums of the image.
+        """
+        self.sat = sat
+        self.proi = proi
+        self.broi = broi
+        if isinstance(lum_img, SparseFrame):
+            self.lum_img = lum_img
+        else:
+            self.lum_img = np.asarray(lum_img)
+
+        checkRoi(proi, broi)
+
+        self.dx_ndx, self.dy_ndx = roiIndices(droi)
+        self.px_ndx, self.py_ndx = roiIndices(proi)
+        self.bx_ndx, self.by_ndx = roiIndices(broi)
+        self._peak_img = None
+        self._back_img = None
+        if not isinstance(self.lum_img, SparseFrame):
+            self._peak_img = self.lum_img[self.py_ndx[0]:self.py_ndx[1],
+                             self.px_ndx[0]:self.px_ndx[1]]  # note y is rows, x is colums
+            self._back_img = self.lum_img[self.by_ndx[0]:self.by_ndx[1], self.bx_ndx[0]:self.bx_ndx[1]]
+
+        self.peakMask = None
+        self.backMask = None
+        if pixelMask is not None:
+            self.backMask = pixelMask.masked[self.by_ndx[0]:self.by_ndx[1], self.bx_ndx[0]:self.bx_ndx[1]]
+            self.peakMask = pixelMask.masked[self.py_ndx[0]:self.py_ndx[1], self.px_ndx[0]:self.px_ndx[1]]
+
+        self.backVar = None
+        self.peakVar = None
+        if variance is not None:
+            self.backVar = variance[self.by_ndx[0]:self.by_ndx[1], self.bx_ndx[0]:self.bx_ndx[1]]
+            self.peakVar = variance[self.py_ndx[0]:self.py_ndx[1], self.px_ndx[0]:self.px_ndx[1]]
+
+    @property
+    def peak_img(self):
+        """Peak area as a 2D array, expanded from a SparseFrame only when asked for."""
+        if self._peak_img is None:
+            self._peak_img = self.back_img[self.py_ndx[0] - self.by_ndx[0]:self.py_ndx[1] - self.by_ndx[0],
+                             self.px_ndx[0] - self.bx_ndx[0]:self.px_ndx[1] - self.bx_ndx[0]]
+        return self._peak_img
+
+    @property
+    def back_img(self):
+        """Background area as a 2D array, expanded from a SparseFrame only when asked for (2D integrals)."""
+        if self._back_img is None:
+            self._back_img = self.lum_img.crop(self.by_ndx[0], self.by_ndx[1], self.bx_ndx[0], self.bx_ndx[1])
+        return self._back_img
 
     def areaIntegral(self):
         """Return values of area integration
@@ -68,12 +191,31 @@ class AreaData(object):
            sig_I(P) = sqrt(sig_I(A1)^2 + sig_I(A2)^2 + sig_I(B1)^2 + sig_I(B2)^2)
         """
         try:
-            AreaP = float(self.peak_img.size)  # AreaP = A1
-            AreaB = float(self.back_img.size)  # AreaB = A2
-            IAP = float(np.sum(self.peak_img.flatten()));
-            sigIAP = np.sqrt(IAP)
-            IAB = float(np.sum(self.back_img.flatten()));
-            sigIAB = np.sqrt(IAB)
+            if isinstance(self.lum_img, SparseFrame):
+                AreaP = float(self.lum_img.size(self.py_ndx[0], self.py_ndx[1], self.px_ndx[0], self.px_ndx[1]) -
+                              maskedCount(self.peakMask))
+                AreaB = float(self.lum_img.size(self.by_ndx[0], self.by_ndx[1], self.bx_ndx[0], self.bx_ndx[1]) -
+                              maskedCount(self.backMask))
+            else:
+                AreaP = float(self.peak_img.size - maskedCount(self.peakMask))  # AreaP = A1
+                AreaB = float(self.back_img.size - maskedCount(self.backMask))  # AreaB = A2
+            if self.sat is not None:
+                IAP = self.sat.sum(self.py_ndx[0], self.py_ndx[1], self.px_ndx[0], self.px_ndx[1])
+                IAB = self.sat.sum(self.by_ndx[0], self.by_ndx[1], self.bx_ndx[0], self.bx_ndx[1])
+            elif isinstance(self.lum_img, SparseFrame):
+                IAP = float(self.lum_img.sum(self.py_ndx[0], self.py_ndx[1], self.px_ndx[0], self.px_ndx[1],
+                                             masked=self.peakMask))
+                IAB = float(self.lum_img.sum(self.by_ndx[0], self.by_ndx[1], self.bx_ndx[0], self.bx_ndx[1],
+                                             masked=self.backMask))
+            else:
+                IAP = maskedSum(self.peak_img, self.peakMask)
+                IAB = maskedSum(self.back_img, self.backMask)
+            if self.backVar is not None:
+                sigIAP = np.sqrt(maskedSum(self.peakVar, self.peakMask))
+                sigIAB = np.sqrt(maskedSum(self.backVar, self.backMask))
+            else:
+                sigIAP = np.sqrt(IAP)
+                sigIAB = np.sqrt(IAB)
             IB2 = AreaB * (IAB - IAP) / (AreaB - AreaP)
             sigIB2 = np.sqrt(sigIAP ** 2 + sigIAB ** 2) * AreaB / (AreaB - AreaP)
             IB1 = IB2 * AreaP / AreaB
@@ -86,66 +228,92 @@ class AreaData(object):
 
     def lineIntegral(self, direction, deg):
         try:
-            bxw, byw = self.back_img.shape
             if direction == 0:
                 xp = np.arange(self.px_ndx[0], self.px_ndx[1])
                 xb = np.arange(self.bx_ndx[0], self.bx_ndx[1])
-                yb = np.sum(self.back_img, 0)
-                yb_err = np.sqrt(yb)
             elif direction == 1:
                 xp = np.arange(self.py_ndx[0], self.py_ndx[1])
                 xb = np.arange(self.by_ndx[0], self.by_ndx[1])
-                yb = np.sum(self.back_img, 1)
-                yb_err = np.sqrt(yb)
-            xb_sub = xb
-            yb_sub = yb
-            yb_err_sub = yb_err
-            argndx = []
-            for x in xp:
-                argndx.append(np.argmin(abs(xb_sub - x)))
-            xb_sub = np.delete(xb_sub, argndx)
-            yb_sub = np.delete(yb_sub, argndx)
-            yb_err_sub = np.delete(yb_err_sub, argndx)
-            pln = np.polyfit(xb_sub, yb_sub, deg)
-            polynomial = np.poly1d(pln)
-            yb_sub_pln = polynomial(xb_sub)
-            yb_sub_pln_stderr = np.sqrt(sum((yb_sub - yb_sub_pln) ** 2) / len(yb_sub))
-            yb_pln = polynomial(xb)
-
-            I = sum(yb - yb_pln)
-            sigI = np.sqrt(sum(yb_err ** 2 + yb_sub_pln_stderr ** 2))
+            if self.sat is not None:
+                yb = self.sat.profile(direction, self.by_ndx[0], self.by_ndx[1], self.bx_ndx[0], self.bx_ndx[1])
+            elif isinstance(self.lum_img, SparseFrame):
+                yb = self.lum_img.profile(direction, self.by_ndx[0], self.by_ndx[1], self.bx_ndx[0], self.bx_ndx[1],
+                                          masked=self.backMask)
+            else:
+                yb = maskedProfile(self.back_img, self.backMask, direction)
+            ybVar = yb if self.backVar is None else maskedProfile(self.backVar, self.backMask, direction)
+            keep = outsidePeak(xb, xp)
+            if self.backMask is not None:
+                yb, measured = fillMaskedLines(yb, self.backMask, direction)
+                ybVar = fillMaskedLines(ybVar, self.backMask, direction)[0]
+                keep = keep & measured
+            yb_err = np.sqrt(ybVar)
+            yb_pln, yb_sub_pln_stderr = polynomialBackground(xb, keep, deg).fit(yb)
+
+            I = np.sum(yb - yb_pln)
+            sigI = np.sqrt(np.sum(yb_err ** 2 + yb_sub_pln_stderr ** 2))
         except (RuntimeWarning, RuntimeError) as e:
             print(e)
         return xb, yb, yb_err, yb_pln, I, sigI
 
-    def Integral2d(self, kx, ky):
+    def Integral2d(self, kx, ky, reuseKnots=False):
+        """2D integration with a spline background.
+        :param kx, ky: spline orders
+        :param reuseKnots: use the knots found on the first frame integrated with this roi, only the coefficients are
+        fitted again
+        :return: X, Y, fitted background, background area, I, sigI
+        """
         try:
-            xp = range(self.px_ndx[0], self.px_ndx[1])  # x positions in peak area
-            yp = range(self.py_ndx[0], self.py_ndx[1])  # y positions in peak area
-            xb = range(self.bx_ndx[0], self.bx_ndx[1])  # x positions in background area
-            yb = range(self.by_ndx[0], self.by_ndx[1])  # y positions in background area
-            # x,y,z for 2d spline interpolation
-            x = []
-            y = []
-            z = [];
-            z_w_peak = []
-            for i in xb:
-                for j in yb:
-                    z_w_peak.append(self.lum_img[j, i])
-                    if (i in xp) and (j in yp):
-                        pass
-                    else:
-                        x.append(i)
-                        y.append(j)
-                        z.append(self.lum_img[j, i])
-            tck = interpolate.bisplrep(x, y, z, w=1. / np.sqrt(z), kx=kx, ky=ky, s=None)
-            z_back = interpolate.bisplev(xb, yb, tck)
-            z_w_peak = np.array(z_w_peak)
+            xb = np.arange(self.bx_ndx[0], self.bx_ndx[1])  # x positions in background area
+            yb = np.arange(self.by_ndx[0], self.by_ndx[1])  # y positions in background area
+            # x,y,z for 2d spline interpolation, x major like bisplev's output
+            xg, yg = np.meshgrid(xb, yb, indexing='ij')
+            z_grid = self.back_img.T
+            in_peak = (xg >= self.px_ndx[0]) & (xg < self.px_ndx[1]) & (yg >= self.py_ndx[0]) & (yg < self.py_ndx[1])
+            counted = Ellipsis
+            if self.backMask is not None:
+                in_peak |= self.backMask.T  # masked pixels are neither fitted nor integrated
+                counted = ~self.backMask.T.ravel()
+            x = xg[~in_peak]
+            y = yg[~in_peak]
+            z = z_grid[~in_peak]
+            var_grid = z_grid if self.backVar is None else self.backVar.T
+            w = 1. / np.sqrt(np.maximum(var_grid[~in_peak], 1))  # Poisson weights, finite for pixels without counts
+            z_w_peak = z_grid.ravel()
+            if reuseKnots:
+                key = (tuple(self.bx_ndx), tuple(self.by_ndx), tuple(self.px_ndx), tuple(self.py_ndx), kx, ky)
+                knots = splineKnots(key, x, y, z, w, kx, ky)
+                z_back = interpolate.bisplev(xb, yb, fixedKnotSpline(x, y, z, w, knots, kx, ky))
+            else:
+                tck = interpolate.bisplrep(x, y, z, w=w, kx=kx, ky=ky, s=None)
+                z_back = interpolate.bisplev(xb, yb, tck)
             z_wo_back = z_w_peak - np.array(z_back).flatten()
-            z_wo_back_stderr = np.sqrt(z_w_peak)
-            I = np.sum(z_wo_back, 0)
-            sigI = np.sqrt(np.sum(z_wo_back_stderr ** 2))
+            I = np.sum(z_wo_back[counted], 0)
+            sigI = np.sqrt(np.sum(var_grid.ravel()[counted], dtype=np.float64))
+            X, Y = np.meshgrid(xb, yb)
+        except (RuntimeWarning, RuntimeError) as e:
+            print(e)
+        return X, Y, z_back.T, self.back_img, I, sigI
+
+    def Integral2dPolynomial(self, order, mask=None, weights=None):
+        """2D integration with a polynomial background surface instead of a spline. The fit is a single linear solve
+        that is shared by every frame integrated with the same roi, so it is fast and takes a predictable time.
+        :param order: total order of the polynomial surface
+        :param mask: optional 2D boolean array over the background area, False for pixels left out of the fit
+        :param weights: optional 2D array of pixel weights over the background area
+        :return: same as Integral2d
+        """
+        try:
+            xb = np.arange(self.bx_ndx[0], self.bx_ndx[1])
+            yb = np.arange(self.by_ndx[0], self.by_ndx[1])
+            keep = backgroundPixels(self.proi, self.broi, mask)
+            if self.backMask is not None:
+                keep &= ~self.backMask
+            z_back = polynomialSurface(xb, yb, keep, order, weights).fit(self.back_img)
+            IAB = maskedSum(self.back_img, self.backMask)
+            I = IAB - maskedSum(z_back, self.backMask)
+            sigI = np.sqrt(IAB if self.backVar is None else maskedSum(self.backVar, self.backMask))
             X, Y = np.meshgrid(xb, yb)
         except (RuntimeWarning, RuntimeError) as e:
             print(e)
-        return X, Y, z_back.T, self.back_img, I, sigI
\ No newline at end of file
+        return X, Y, z_back, self.back_img, I, sigI
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from scipy import interpolate, linalg
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+MAX_CACHED_FITS = 64
+_polynomialFits = {}
+_polynomialSurfaces = {}
+_splineKnots = {}
+
+
+class PolynomialBackground(object):
+    """Least squares polynomial fit of background profiles, with the design matrix factored once. The positions of
+    the profiles only depend on the roi, so every frame of a scan is fitted with the same two projection matrices and
+    a whole scan costs one matrix product.
+    """
+
+    def __init__(self, xb, keep, deg):
+        """
+        :param xb: positions of the background profile
+        :param keep: boolean mask of the positions used in the fit (outside the peak)
+        :param deg: order of the polynomial
+        """
+        xb = np.asarray(xb, dtype=np.float64)
+        center = xb.mean()
+        scale = max(np.abs(xb - center).max(), 1.0)  # keeps the Vandermonde matrix well conditioned
+        vander = np.vander((xb - center) / scale, deg + 1)
+        design = vander[keep]
+        pinv = np.linalg.pinv(design)
+
+        self.keep = keep
+        self.subProjection = np.dot(design, pinv)  # fitted values at the positions used in the fit
+        self.fullProjection = np.dot(vander, pinv)  # fitted values at every position
+
+    def fit(self, yb):
+        """Fits one or many profiles.
+        :param yb: profile, or 2D array with one profile per row
+        :return: fitted background at every position (same shape as yb), residual standard error of each profile
+        """
+        yb_sub = np.asarray(yb, dtype=np.float64)[..., self.keep]
+        yb_sub_pln = np.dot(yb_sub, self.subProjection.T)
+        yb_pln = np.dot(yb_sub, self.fullProjection.T)
+        yb_sub_pln_stderr = np.sqrt(np.sum((yb_sub - yb_sub_pln) ** 2, -1) / yb_sub.shape[-1])
+        return yb_pln, yb_sub_pln_stderr
+
+
+def polynomialBackground(xb, keep, deg):
+    """Returns the PolynomialBackground of a roi, factoring it only the first time it is asked for.
+    :param xb: consecutive positions of the background profile
+    :param keep: boolean mask of the positions used in the fit
+    :param deg: order of the polynomial
+    :return: PolynomialBackground
+    """
+    key = (int(xb[0]), len(xb), np.asarray(keep).tobytes(), deg)
+    fit = _polynomialFits.get(key)
+    if fit is None:
+        if len(_polynomialFits) >= MAX_CACHED_FITS:
+            _polynomialFits.clear()
+        fit = _polynomialFits[key] = PolynomialBackground(xb, keep, deg)
+    return fit
+
+
+class PolynomialSurface(object):
+    """Weighted least squares fit of a 2D polynomial background surface. The normal equations only depend on the
+    roi, the polynomial order and the pixels used, so they are factored once and every frame of a scan is fitted
+    with the same solve.
+    """
+
+    def __init__(self, xb, yb, keep, order, weights=None):
+        """
+        :param xb: x positions (columns) of the background area
+        :param yb: y positions (rows) of the background area
+        :param keep: 2D boolean array (rows, columns), pixels used in the fit
+        :param order: total order of the polynomial, terms x**i * y**j with i + j <= order
+        :param weights: optional 2D array of pixel weights, same shape as keep
+        """
+        tx = self._scaled(xb)
+        ty = self._scaled(yb)
+        tx, ty = np.meshgrid(tx, ty)
+        terms = [(i, total - i) for total in range(order + 1) for i in range(total + 1)]
+        self.design = np.column_stack([(tx ** i * ty ** j).ravel() for i, j in terms])
+        self.shape = keep.shape
+
+        w = keep.ravel().astype(np.float64)
+        if weights is not None:
+            w *= np.asarray(weights, dtype=np.float64).ravel()
+        self.fitPixels = np.flatnonzero(w)
+        weighted = self.design[self.fitPixels] * w[self.fitPixels, np.newaxis]
+        try:
+            factor = linalg.cho_factor(np.dot(self.design[self.fitPixels].T, weighted))
+        except linalg.LinAlgError:
+            raise ValueError("Not enough background pixels to fit a polynomial surface of order " + str(order) + ".")
+        self.solveMatrix = linalg.cho_solve(factor, weighted.T)  # (A^T W A)^-1 A^T W
+
+    def _scaled(self, positions):
+        positions = np.asarray(positions, dtype=np.float64)
+        center = positions.mean()
+        return (positions - center) / max(np.abs(positions - center).max(), 1.0)
+
+    def fit(self, back):
+        """Fits one background area or a stack of them.
+        :param back: (rows, columns) or (N, rows, columns) array
+        :return: fitted surfaces, same shape as back
+        """
+        back = np.asarray(back)
+        flat = back.reshape(back.shape[:-2] + (-1,))[..., self.fitPixels]
+        coefficients = np.dot(flat, self.solveMatrix.T)
+        return np.dot(coefficients, self.design.T).reshape(back.shape)
+
+
+def polynomialSurface(xb, yb, keep, order, weights=None):
+    """Returns the PolynomialSurface of a roi, factoring it only the first time it is asked for.
+    :param xb: consecutive x positions of the background area
+    :param yb: consecutive y positions of the background area
+    :param keep: 2D boolean array of the pixels used in the fit
+    :param order: total order of the polynomial
+    :param weights: optional 2D array of pixel weights
+    :return: PolynomialSurface
+    """
+    key = (int(xb[0]), len(xb), int(yb[0]), len(yb), np.asarray(keep).tobytes(), order,
+           None if weights is None else np.asarray(weights, dtype=np.float64).tobytes())
+    fit = _polynomialSurfaces.get(key)
+    if fit is None:
+        if len(_polynomialSurfaces) >= MAX_CACHED_FITS:
+            _polynomialSurfaces.clear()
+        fit = _polynomialSurfaces[key] = PolynomialSurface(xb, yb, keep, order, weights)
+    return fit
+
+
+def splineKnots(key, x, y, z, w, kx, ky):
+    """Knot vectors of the background spline of a roi, boundary knots included, as returned by bisplrep. bisplrep
+    only chooses them the first time the roi is seen, later frames reuse them and only solve for the coefficients.
+    :param key: hashable identifying the roi and spline orders
+    :param x, y, z, w: background points and weights given to bisplrep
+    :param kx, ky: spline orders
+    :return: full knot vectors along x and y
+    """
+    knots = _splineKnots.get(key)
+    if knots is None:
+        if len(_splineKnots) >= MAX_CACHED_FITS:
+            _splineKnots.clear()
+        knots = _splineKnots[key] = tuple(interpolate.bisplrep(x, y, z, w=w, kx=kx, ky=ky, s=None)[:2])
+    return knots
+
+
+def fixedKnotSpline(x, y, z, w, knots, kx, ky):
+    """Weighted least squares spline through the background points with the knots already chosen (bisplrep task -1,
+    which, unlike LSQBivariateSpline, copes with the knots that fall in the peak hole).
+    :param knots: knots returned by splineKnots
+    :return: tck for bisplev
+    """
+    return interpolate.bisplrep(x, y, z, w=w, kx=kx, ky=ky, task=-1, tx=knots[0], ty=knots[1])
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from areaData import backgroundPixels, checkRoi, fillMaskedLines, outsidePeak, roiIndices
+from backgroundFit import polynomialBackground, polynomialSurface
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+INTEGRALS_DTYPE = np.dtype([('I2d', np.float64), ('sigI2d', np.float64),
+                            ('I1d0', np.float64), ('sigI1d0', np.float64),
+                            ('I1d1', np.float64), ('sigI1d1', np.float64)])
+SURFACE_INTEGRALS_DTYPE = np.dtype([('I', np.float64), ('sigI', np.float64)])
+
+
+def integrateStack(frames, proi, broi, deg0=1, deg1=1, chunkSize=256, pixelMask=None, background=None):
+    """Area and line integrals of every frame of a scan, computed with array reductions over the whole stack.
+    Gives the same values as AreaData.areaIntegral and AreaData.lineIntegral called frame by frame.
+    :param frames: (N, rows, columns) array, ScanCube, ScanContainer or list of 2D arrays
+    :param proi: peak area (x center, y center, x width, y width), or (N, 4) array with the area of each frame
+    :param broi: background area, same format
+    :param deg0: order of the background polynomial along x (lineIntegral direction 0)
+    :param deg1: order of the background polynomial along y (lineIntegral direction 1)
+    :param chunkSize: number of frames held in memory at once
+    :param pixelMask: optional PixelMask, the masked pixels are left out like in AreaData. The line backgrounds of a
+    chunk are fitted on the lines that have unmasked pixels in every frame of the chunk.
+    :param background: optional RunningBackground subtracted from the frames (SubtractedFrames), the errors are
+    propagated from the counts before the subtraction and the variance of the background, like AreaData with
+    RunningBackground.errorVariance
+    :return: 1D array of INTEGRALS_DTYPE, one row per frame
+    """
+    result = np.empty(len(frames), dtype=INTEGRALS_DTYPE)
+    for indices, groupProi, groupBroi, xShifts, yShifts in frameGroups(proi, broi, len(frames)):
+        px, py = roiIndices(groupProi)
+        bx, by = roiIndices(groupBroi)
+        for start in range(0, len(indices), chunkSize):
+            stop = min(start + chunkSize, len(indices))
+            regions = [(slice(by[0] + yShifts[i], by[1] + yShifts[i]), slice(bx[0] + xShifts[i], bx[1] + xShifts[i]))
+                       for i in range(start, stop)]
+            back = np.array([frames[indices[i]][region] for i, region in zip(range(start, stop), regions)])
+            peak = back[:, py[0] - by[0]:py[1] - by[0], px[0] - bx[0]:px[1] - bx[0]]
+            backVar = peakVar = ybVar0 = ybVar1 = None
+            if background is not None:
+                backVar = np.array([background.errorVariance(b, region) for b, region in zip(back, regions)])
+                peakVar = backVar[:, py[0] - by[0]:py[1] - by[0], px[0] - bx[0]:px[1] - bx[0]]
+            chunk = np.empty(stop - start, dtype=INTEGRALS_DTYPE)
+            measured0 = measured1 = None
+
+            if pixelMask is None:
+                chunk['I2d'], chunk['sigI2d'] = areaIntegrals(peak, back, peakVar=peakVar, backVar=backVar)
+                yb0 = back.sum(1, dtype=np.float64)
+                yb1 = back.sum(2, dtype=np.float64)
+                if backVar is not None:
+                    ybVar0 = backVar.sum(1)
+                    ybVar1 = backVar.sum(2)
+            else:
+                backMasks = np.array([pixelMask.masked[region] for region in regions])
+                peakMasks = backMasks[:, py[0] - by[0]:py[1] - by[0], px[0] - bx[0]:px[1] - bx[0]]
+                back[backMasks] = 0
+                if backVar is not None:
+                    backVar[backMasks] = 0
+                    ybVar0 = fillMaskedLines(backVar.sum(1), backMasks, 1)[0]
+                    ybVar1 = fillMaskedLines(backVar.sum(2), backMasks, 2)[0]
+                chunk['I2d'], chunk['sigI2d'] = areaIntegrals(peak, back, np.count_nonzero(peakMasks, (1, 2)),
+                                                              np.count_nonzero(backMasks, (1, 2)), peakVar, backVar)
+                yb0, measured0 = fillMaskedLines(back.sum(1, dtype=np.float64), backMasks, 1)
+                yb1, measured1 = fillMaskedLines(back.sum(2, dtype=np.float64), backMasks, 2)
+                measured0 = measured0.all(0)
+                measured1 = measured1.all(0)
+
+            chunk['I1d0'], chunk['sigI1d0'] = lineIntegrals(yb0, np.arange(px[0], px[1]), np.arange(bx[0], bx[1]),
+                                                            deg0, measured0, ybVar0)[4:]
+            chunk['I1d1'], chunk['sigI1d1'] = lineIntegrals(yb1, np.arange(py[0], py[1]), np.arange(by[0], by[1]),
+                                                            deg1, measured1, ybVar1)[4:]
+            result[indices[start:stop]] = chunk
+    return result
+
+
+def frameGroups(proi, broi, count):
+    """Groups the frames of a scan whose areas, once rounded to pixels by roiIndices like AreaData does, are the
+    areas of the first frame of the group moved by whole pixels. Each group is integrated with one set of slices.
+    :param proi: peak area, or (N, 4) array with the area of each frame, as given by roiTracker.trackRois
+    :param broi: background area, same format
+    :param count: number of frames
+    :return: list of (frame indices, peak area, background area, x shifts, y shifts), the areas are those of the
+    first frame of the group, as given
+    """
+    if np.ndim(proi) == 1 and np.ndim(broi) == 1:
+        checkRoi(proi, broi)
+        return [(np.arange(count), proi, broi, np.zeros(count, dtype=int), np.zeros(count, dtype=int))]
+
+    proi = np.broadcast_to(np.asarray(proi), (count, 4))
+    broi = np.broadcast_to(np.asarray(broi), (count, 4))
+    groups = {}
+    for i in range(count):
+        frameProi, frameBroi = tuple(proi[i].tolist()), tuple(broi[i].tolist())
+        checkRoi(frameProi, frameBroi)
+        px, py = roiIndices(frameProi)
+        bx, by = roiIndices(frameBroi)
+        key = (px[0] - bx[0], px[1] - bx[0], py[0] - by[0], py[1] - by[0], bx[1] - bx[0], by[1] - by[0])
+        groups.setdefault(key, []).append((i, frameProi, frameBroi, bx[0], by[0]))
+
+    result = []
+    for members in groups.values():
+        x0 = np.array([member[3] for member in members])
+        y0 = np.array([member[4] for member in members])
+        result.append((np.array([member[0] for member in members]), members[0][1], members[0][2],
+                       x0 - x0[0], y0 - y0[0]))
+    return result
+
+
+def integrateStackSurface(frames, proi, broi, order, mask=None, weights=None, chunkSize=256, pixelMask=None,
+                          background=None):
+    """Batch AreaData.Integral2dPolynomial, the background surfaces of the frames of a chunk that have the same
+    masked pixels come from one solve.
+    :param frames: (N, rows, columns) array, ScanCube, ScanContainer or list of 2D arrays
+    :param proi: peak area (x center, y center, x width, y width), or (N, 4) array with the area of each frame
+    :param broi: background area, same format
+    :param order: total order of the polynomial surface
+    :param mask: optional 2D boolean array over the background area, False for pixels left out of the fit
+    :param weights: optional 2D array of pixel weights over the background area
+    :param chunkSize: number of frames held in memory at once
+    :param pixelMask: optional PixelMask, the masked pixels are neither fitted nor integrated
+    :param background: optional RunningBackground subtracted from the frames, for the errors like integrateStack
+    :return: 1D array of SURFACE_INTEGRALS_DTYPE, one row per frame
+    """
+    result = np.empty(len(frames), dtype=SURFACE_INTEGRALS_DTYPE)
+    for indices, groupProi, groupBroi, xShifts, yShifts in frameGroups(proi, broi, len(frames)):
+        bx, by = roiIndices(groupBroi)
+        xb, yb = np.arange(bx[0], bx[1]), np.arange(by[0], by[1])
+        keep = backgroundPixels(groupProi, groupBroi, mask)
+        for start in range(0, len(indices), chunkSize):
+            stop = min(start + chunkSize, len(indices))
+            regions = [(slice(by[0] + yShifts[i], by[1] + yShifts[i]), slice(bx[0] + xShifts[i], bx[1] + xShifts[i]))
+                       for i in range(start, stop)]
+            back = np.array([frames[indices[i]][region] for i, region in zip(range(start, stop), regions)])
+            backVar = back
+            if background is not None:
+                backVar = np.array([background.errorVariance(b, region) for b, region in zip(back, regions)])
+            if pixelMask is None:
+                counted = np.ones(back.shape, dtype=bool)
+            else:
+                counted = ~np.array([pixelMask.masked[region] for region in regions])
+
+            patterns = {}
+            for n, frameCounted in enumerate(counted):
+                patterns.setdefault(frameCounted.tobytes(), []).append(n)
+            for members in patterns.values():
+                frameCounted = counted[members[0]]
+                # the fit positions are centered, so the surface of the first frame of the group fits the others
+                surface = polynomialSurface(xb, yb, keep & frameCounted, order, weights)
+                total = np.sum(back[members][:, frameCounted], 1, dtype=np.float64)
+                rows = indices[start + np.array(members)]
+                result['I'][rows] = total - np.sum(surface.fit(back[members])[:, frameCounted], 1)
+                result['sigI'][rows] = np.sqrt(np.sum(backVar[members][:, frameCounted], 1, dtype=np.float64))
+    return result
+
+
+def areaIntegrals(peak, back, peakMasked=0, backMasked=0, peakVar=None, backVar=None):
+    """Vectorized AreaData.areaIntegral.
+    :param peak: (N, rows, columns) peak areas, masked pixels set to zero
+    :param back: (N, rows, columns) background areas, masked pixels set to zero
+    :param peakMasked: number of masked pixels in the peak area of each frame
+    :param backMasked: number of masked pixels in the background area of each frame
+    :param peakVar: optional pixel variances of the peak areas, masked pixels set to zero
+    :param backVar: optional pixel variances of the background areas, masked pixels set to zero
+    :return: I, sigI, 1D arrays
+    """
+    varP = varB = None
+    if backVar is not None:
+        varP = np.sum(peakVar, (1, 2))
+        varB = np.sum(backVar, (1, 2))
+    return integralsFromSums(np.sum(peak, (1, 2), dtype=np.float64), np.sum(back, (1, 2), dtype=np.float64),
+                             float(peak[0].size) - peakMasked, float(back[0].size) - backMasked, varP, varB)
+
+
+def integralsFromSums(IAP, IAB, AreaP, AreaB, varP=None, varB=None):
+    """AreaData.areaIntegral from the sums of the peak and background areas, arguments can be arrays.
+    :param IAP: peak area sums
+    :param IAB: background area sums
+    :param AreaP: number of pixels in the peak area
+    :param AreaB: number of pixels in the background area
+    :param varP: optional variance of the peak area sums, IAP by default (counts)
+    :param varB: optional variance of the background area sums, IAB by default
+    :return: I, sigI
+    """
+    sigIAP = np.sqrt(IAP if varP is None else varP)
+    sigIAB = np.sqrt(IAB if varB is None else varB)
+    IB2 = AreaB * (IAB - IAP) / (AreaB - AreaP)
+    sigIB2 = np.sqrt(sigIAP ** 2 + sigIAB ** 2) * AreaB / (AreaB - AreaP)
+    IB1 = IB2 * AreaP / AreaB
+    sigIB1 = sigIB2 * AreaP / AreaB
+    I = 0.5 * (IAP + IAB - IB1 - IB2)
+    sigI = 0.5 * np.sqrt(sigIAP ** 2.0 + sigIAB ** 2.0 + sigIB1 ** 2.0 + sigIB2 ** 2.0)
+    return I, sigI
+
+
+def lineIntegrals(yb, xp, xb, deg, measured=None, ybVar=None):
+    """Vectorized AreaData.lineIntegral, the background of every frame is fitted with one matrix product.
+    :param yb: (N, len(xb)) background profiles
+    :param xp: positions in the peak area
+    :param xb: positions in the background area
+    :param deg: order of the background polynomial
+    :param measured: optional boolean array, False for the positions left out of the background fit
+    :param ybVar: optional variance of the profiles, yb by default (counts)
+    :return: xb, yb, yb_err, yb_pln, I, sigI, with one row per frame in the 2D arrays
+    """
+    yb = np.asarray(yb, dtype=np.float64)
+    yb_err = np.sqrt(yb if ybVar is None else ybVar)
+    keep = outsidePeak(xb, xp)
+    if measured is not None:
+        keep = keep & measured
+    yb_pln, yb_sub_pln_stderr = polynomialBackground(xb, keep, deg).fit(yb)
+
+    I = np.sum(yb - yb_pln, 1)
+    sigI = np.sqrt(np.sum(yb_err ** 2 + yb_sub_pln_stderr[:, np.newaxis] ** 2, 1))
+    return xb, yb, yb_err, yb_pln, I, sigI
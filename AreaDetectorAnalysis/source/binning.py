@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from areaData import roiIndices
+from pixelMask import PixelMask
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+class Binning(object):
+    """Sums blocks of pixels into one, through a reshape, for previews and reductions of large detectors. Counts are
+    summed rather than averaged so that a binned pixel is still Poisson distributed. Rows and columns that don't fill
+    a whole block at the bottom and right edges are dropped.
+    """
+
+    def __init__(self, columns=1, rows=1):
+        """
+        :param columns: pixels per block along x, detectorDialog.getNumPixelsToAverage()[0]
+        :param rows: pixels per block along y, detectorDialog.getNumPixelsToAverage()[1]
+        """
+        if columns < 1 or rows < 1:
+            raise ValueError("Binning factors must be at least 1.")
+        self.columns = int(columns)
+        self.rows = int(rows)
+
+    @property
+    def isIdentity(self):
+        return self.columns == 1 and self.rows == 1
+
+    def shape(self, shape):
+        """
+        :param shape: (rows, columns) of the images
+        :return: (rows, columns) of the binned images
+        """
+        return shape[0] // self.rows, shape[1] // self.columns
+
+    def apply(self, frames):
+        """Bins a frame or a stack of frames.
+        :param frames: 2D image or (N, rows, columns) stack
+        :return: binned array, integer images are summed in 64 bits
+        """
+        frames = np.asarray(frames)
+        if self.isIdentity:
+            return frames
+        rows, columns = self.shape(frames.shape[-2:])
+        blocks = frames[..., :rows * self.rows, :columns * self.columns]
+        blocks = blocks.reshape(frames.shape[:-2] + (rows, self.rows, columns, self.columns))
+        dtype = np.int64 if np.issubdtype(frames.dtype, np.integer) else np.float64
+        return blocks.sum((-3, -1), dtype=dtype)
+
+    def applyStack(self, frames, chunkSize=64):
+        """Bins every frame of a scan, a chunk at a time, so only the binned scan is held in memory.
+        :param frames: (N, rows, columns) array, ScanCube, ScanContainer or list of 2D arrays
+        :param chunkSize: number of frames read at once
+        :return: (N, binned rows, binned columns) array
+        """
+        first = self.apply(frames[0])
+        result = np.empty((len(frames),) + first.shape, dtype=first.dtype)
+        for start in range(0, len(frames), chunkSize):
+            stop = min(start + chunkSize, len(frames))
+            result[start:stop] = self.apply(np.array([frames[i] for i in range(start, stop)]))
+        return result
+
+    def mask(self, pixelMask):
+        """Bins a PixelMask, a block is masked when any of its pixels is.
+        :param pixelMask: PixelMask of the unbinned images
+        :return: PixelMask of the binned images
+        """
+        return PixelMask(self.shape(pixelMask.shape), self.apply(pixelMask.masked) > 0)
+
+    def roi(self, roi):
+        """Converts a roi from image pixels to binned pixels, the binned roi covers the blocks holding the pixels of
+        the roi. Its bounds are whole numbers, so roiIndices gives exactly those blocks.
+        :param roi: (x center, y center, x width, y width)
+        :return: roi in binned pixels
+        """
+        x, y = roiIndices(roi)
+        return _boundsRoi(x[0] // self.columns, (x[1] - 1) // self.columns,
+                          y[0] // self.rows, (y[1] - 1) // self.rows)
+
+    def unbinRoi(self, roi):
+        """Converts a roi from binned pixels to the image pixels of its blocks.
+        :param roi: (x center, y center, x width, y width) in binned pixels
+        :return: roi in image pixels
+        """
+        x, y = roiIndices(roi)
+        return _boundsRoi(x[0] * self.columns, x[1] * self.columns - 1, y[0] * self.rows, y[1] * self.rows - 1)
+
+    def pixelPositions(self, positions, direction):
+        """Converts binned positions to the image pixel at the center of their blocks, for plotting profiles of binned
+        images against image pixels.
+        :param positions: binned x positions (direction 0) or y positions (direction 1)
+        :param direction: 0 for x, 1 for y, like AreaData.lineIntegral
+        :return: float array of image pixel positions
+        """
+        size = self.columns if direction == 0 else self.rows
+        return np.asarray(positions) * size + (size - 1) / 2.0
+
+
+def _boundsRoi(x0, x1, y0, y1):
+    """Roi covering the pixels x0 to x1 and y0 to y1, last ones included."""
+    return (x0 + x1) / 2.0, (y0 + y1) / 2.0, float(x1 - x0), float(y1 - y0)
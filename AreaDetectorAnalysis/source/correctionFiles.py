@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import re
+import numpy as np
+from PIL import Image
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+SIDECAR_EXTENSION = '.npy'
+SIDECAR_PATTERN = re.compile(r'\.[0-9a-f]+-[0-9a-f]+\.npy(\.[0-9]+\.tmp)?$')
+
+
+def sidecarPath(path):
+    """Binary copy of a correction file, named after the size and modification time of the file so that it goes
+    stale as soon as the file changes.
+    :param path: correction file
+    :return: path of the sidecar
+    """
+    st = os.stat(path)
+    return path + '.' + '{:x}-{:x}'.format(st.st_size, int(st.st_mtime * 1000000)) + SIDECAR_EXTENSION
+
+
+def isSidecar(path):
+    """Whether a file is the sidecar of another file, or a sidecar being written.
+    :param path: file path
+    :return: bool
+    """
+    return SIDECAR_PATTERN.search(os.path.basename(path)) is not None
+
+
+def loadSidecar(path, parse):
+    """Memory maps the sidecar of a correction file, parsing the file and writing the sidecar when there is none.
+    :param path: correction file
+    :param parse: function returning the array read from the file
+    :return: read only array
+    """
+    sidecar = sidecarPath(path)
+    if os.path.isfile(sidecar):
+        try:
+            return np.load(sidecar, mmap_mode='r')
+        except (IOError, OSError, ValueError):
+            pass  # partly written or damaged, write it again
+
+    data = parse(path)
+    try:
+        _removeSidecars(path)
+        temp = sidecar + '.' + str(os.getpid()) + '.tmp'
+        with open(temp, 'wb') as f:
+            np.save(f, data)
+        os.rename(temp, sidecar)  # other processes never see a partial file
+        return np.load(sidecar, mmap_mode='r')
+    except (IOError, OSError):
+        return data  # read only directory, or the sidecar was replaced by another process in the meantime
+
+
+def _removeSidecars(path):
+    folder, name = os.path.split(path)
+    for other in os.listdir(folder or '.'):
+        if other.startswith(name + '.') and other.endswith(SIDECAR_EXTENSION):
+            os.remove(os.path.join(folder, other))
+
+
+def parseBadPixels(path):
+    """Reads a bad pixel file, one "x,y x,y" line per bad pixel, the bad pixel then its replacing pixel.
+    :param path: bad pixel file
+    :return: (N, 4) int32 array of bad x, bad y, replacing x, replacing y
+    """
+    rows = []
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.replace(',', ' ').split()
+            if len(fields) >= 4 and not line.lstrip().startswith('#'):
+                rows.append([int(v) for v in fields[:4]])
+    return np.array(rows, dtype=np.int32).reshape(-1, 4)
+
+
+def loadBadPixels(path):
+    """Bad pixels and the pixels that replace them, from the binary sidecar when it is up to date.
+    :param path: bad pixel file
+    :return: (N, 2) array of bad (x, y), (N, 2) array of replacing (x, y)
+    """
+    pixels = loadSidecar(path, parseBadPixels)
+    return pixels[:, :2], pixels[:, 2:]
+
+
+def parseEfficiency(path):
+    """Reads a flatfield efficiency image.
+    :param path: image file
+    :return: 2D float32 array
+    """
+    return np.array(Image.open(path), dtype=np.float32)
+
+
+def loadEfficiency(path):
+    """Efficiency map, from the binary sidecar when it is up to date.
+    :param path: image file
+    :return: read only 2D float32 array
+    """
+    return loadSidecar(path, parseEfficiency)
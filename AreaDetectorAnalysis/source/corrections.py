@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+class FrameCorrections(object):
+    """Flatfield and bad pixel corrections of one detector, compiled once into a reciprocal efficiency map and index
+    arrays. Correcting a frame, or a whole stack, is then one multiplication and one indexed copy.
+    """
+
+    def __init__(self, shape, badPixels=(), replacingPixels=(), efficiency=None):
+        """
+        :param shape: (rows, columns) of the detector image
+        :param badPixels: (x, y) of each bad pixel
+        :param replacingPixels: (x, y) of the pixel whose value replaces each bad pixel
+        :param efficiency: 2D array of pixel efficiencies, frames are divided by it; None for no flatfield correction.
+        Pixels without a positive efficiency are dead, they are set to zero and listed in self.masked.
+        """
+        self.shape = tuple(shape)
+        self.gain = None
+        self.masked = None
+        if efficiency is not None:
+            if np.shape(efficiency) != self.shape:
+                raise ValueError("Efficiency map doesn't have the shape of the images.")
+            efficiency = np.asarray(efficiency, dtype=np.float64)
+            dead = ~(np.isfinite(efficiency) & (efficiency > 0))
+            self.gain = np.zeros(self.shape, dtype=np.float64)
+            np.reciprocal(efficiency, out=self.gain, where=~dead)
+            if dead.any():
+                self.masked = dead
+
+        # The replacements are done in order, a bad pixel can be replaced by one that was replaced before it.
+        # Sources are resolved to the final pixel here, so that the copy can be done all at once.
+        replaced = {}
+        for (bx, by), (rx, ry) in zip(badPixels, replacingPixels):
+            destination = np.ravel_multi_index((by, bx), self.shape)
+            source = np.ravel_multi_index((ry, rx), self.shape)
+            replaced.pop(destination, None)
+            replaced[destination] = replaced.get(source, source)
+        destination = np.fromiter(replaced.keys(), dtype=np.intp, count=len(replaced))
+        source = np.fromiter(replaced.values(), dtype=np.intp, count=len(replaced))
+        self.destination = np.unravel_index(destination, self.shape)
+        self.source = np.unravel_index(source, self.shape)
+
+    def __len__(self):
+        """Number of bad pixels."""
+        return len(self.destination[0])
+
+    def apply(self, frames, out=None):
+        """Corrects a frame or a stack of frames.
+        :param frames: 2D image or (N, rows, columns) stack
+        :param out: array that receives the result, frames itself to correct in place
+        :return: corrected frames, float when a flatfield is applied
+        """
+        frames = np.asarray(frames)
+        if out is None:
+            dtype = frames.dtype if self.gain is None else np.result_type(frames.dtype, self.gain.dtype)
+            out = np.empty(frames.shape, dtype=dtype)
+        if self.gain is not None:
+            np.multiply(frames, self.gain, out=out)
+        elif out is not frames:
+            out[...] = frames
+        if len(self):
+            out[(Ellipsis,) + self.destination] = out[(Ellipsis,) + self.source]
+        return out
@@ -15,6 +15,7 @@ from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from InstForXrayutilsReader import InstForXrayutilsReader
+from binning import Binning
 
 
 class DetectorDialog(QDialog):
@@ -362,6 +363,15 @@ class DetectorDialog(QDialog):
         self.distanceLnEdit.setValidator(QDoubleValidator())
         self.detectorIDBox = QComboBox()
         self.detectorIDBox.addItem('Pilatus')
+        self.saturationLnEdit = QLineEdit('1048575')  # 20 bit Pilatus counters
+        self.saturationLnEdit.setFixedWidth(55)
+        self.saturationLnEdit.setValidator(QDoubleValidator())
+        self.binSpinBox1 = QSpinBox()
+        self.binSpinBox1.setFixedWidth(55)
+        self.binSpinBox1.setMinimum(1)
+        self.binSpinBox2 = QSpinBox()
+        self.binSpinBox2.setFixedWidth(55)
+        self.binSpinBox2.setMinimum(1)
 
         self.detectorInfoGLayout.addWidget(QLabel("Detector Geometry:"), 0, 0)
         self.detectorInfoGLayout.addWidget(line, 1, 0, 1, 3)
@@ -382,6 +392,11 @@ class DetectorDialog(QDialog):
         self.detectorInfoGLayout.addWidget(self.pixelDirectionBox2, 7, 2, alignment=Qt.AlignRight)
         self.detectorInfoGLayout.addWidget(QLabel("Detector ID:"), 8, 0)
         self.detectorInfoGLayout.addWidget(self.detectorIDBox, 8, 2, alignment=Qt.AlignRight)
+        self.detectorInfoGLayout.addWidget(QLabel("Saturation (counts):"), 9, 0)
+        self.detectorInfoGLayout.addWidget(self.saturationLnEdit, 9, 2)
+        self.detectorInfoGLayout.addWidget(QLabel("Pixels to Bin (x, y):"), 10, 0)
+        self.detectorInfoGLayout.addWidget(self.binSpinBox1, 10, 1)
+        self.detectorInfoGLayout.addWidget(self.binSpinBox2, 10, 2)
 
     def getSampleMotorNames(self):
         names = []
@@ -451,7 +466,16 @@ class DetectorDialog(QDialog):
         return [0, n1, 0, n2]
 
     def getNumPixelsToAverage(self):
-        return [1, 1]
+        """Gets the number of pixels binned together along x and y, the images are binned the same way.
+        :return: list w/ pixels to average
+        """
+        return [self.binSpinBox1.value(), self.binSpinBox2.value()]
+
+    def getBinning(self):
+        """Gets the binning stage applied to the images when they are loaded.
+        :return: Binning
+        """
+        return Binning(*self.getNumPixelsToAverage())
 
     def getDetectorPixelDirection1(self):
         """Gets the detector pixel direction from the detector dialog input.
@@ -501,6 +525,15 @@ class DetectorDialog(QDialog):
         """
         return float(self.distanceLnEdit.text())
 
+    def getSaturation(self):
+        """Gets the counts at which the detector saturates from the detector dialog input.
+        :return: saturation, None if it isn't given
+        """
+        text = self.saturationLnEdit.text().strip()
+        if text == "":
+            return None
+        return float(text)
+
     def createXMLFile(self):
         """Creates an xml file from the data inputted in the detector dialog.
         """
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+from scanIndex import IMAGE_EXTENSIONS, naturalKey
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+class DirectoryWatcher(object):
+    """Polls an images folder during a running scan and reports the images written since the last poll. An image is
+    only reported once it is complete: its size didn't change between two polls and, when known, it has the size of
+    the other images of the scan.
+    """
+
+    def __init__(self, imgDir, knownFiles=(), expectedSize=None):
+        """
+        :param imgDir: images directory
+        :param knownFiles: paths already loaded, they are never reported
+        :param expectedSize: size in bytes of a complete image, None to only wait for the size to settle
+        """
+        self.imgDir = imgDir
+        self.known = set(os.path.normpath(path) for path in knownFiles)
+        self.expectedSize = expectedSize
+        self.growing = {}  # path -> size seen at the last poll
+
+    def poll(self):
+        """Scans the directory once.
+        :return: sorted list with the paths of the new complete images
+        """
+        ready = []
+        for entry in scandir(self.imgDir):
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.normpath(entry.path)
+            if path in self.known:
+                continue
+
+            size = entry.stat().st_size
+            if self.growing.get(path) == size and (self.expectedSize is None or size == self.expectedSize):
+                del self.growing[path]
+                self.known.add(path)
+                ready.append(entry.path)
+            else:
+                self.growing[path] = size
+
+        ready.sort(key=naturalKey)
+        return ready
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import threading
+from collections import OrderedDict
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+class FrameCache(object):
+    """Least recently used cache of raw and corrected frames, limited by the number of bytes it holds.
+    Keys are (path, mtime, corrections), so a frame rewritten on disk or viewed with other corrections is a miss.
+    Cached frames are made read only since they are shared with every caller.
+    """
+
+    def __init__(self, maxBytes=512 * 1024 ** 2):
+        """
+        :param maxBytes: memory budget in bytes
+        """
+        self.maxBytes = maxBytes
+        self.nbytes = 0
+        self.frames = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, path, corrections=None, mtime=None):
+        """Builds the cache key of a frame.
+        :param path: image path
+        :param corrections: hashable description of the corrections applied, None for the raw frame
+        :param mtime: modification time of the frame, read from the file when not given
+        :return: tuple
+        """
+        if mtime is None:
+            mtime = os.path.getmtime(path)
+        return path, mtime, corrections
+
+    def get(self, key):
+        """Returns the cached frame and marks it as the most recently used.
+        :param key: key built by self.key
+        :return: array, SparseFrame or None
+        """
+        with self.lock:
+            frame = self.frames.pop(key, None)
+            if frame is not None:
+                self.frames[key] = frame
+            return frame
+
+    def put(self, key, frame):
+        """Adds a frame, evicting the least recently used ones to stay within the budget.
+        :param key: key built by self.key
+        :param frame: array or SparseFrame
+        :return: the cached frame
+        """
+        frame.setflags(write=False)
+        if frame.nbytes > self.maxBytes:
+            return frame
+
+        with self.lock:
+            old = self.frames.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self.frames[key] = frame
+            self.nbytes += frame.nbytes
+            self._evict()
+        return frame
+
+    def setBudget(self, maxBytes):
+        """Changes the memory budget.
+        :param maxBytes: memory budget in bytes
+        """
+        with self.lock:
+            self.maxBytes = maxBytes
+            self._evict()
+
+    def clear(self):
+        """Removes every frame."""
+        with self.lock:
+            self.frames.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __contains__(self, key):
+        return key in self.frames
+
+    def _evict(self):
+        while self.nbytes > self.maxBytes and self.frames:
+            key, frame = self.frames.popitem(last=False)
+            self.nbytes -= frame.nbytes
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import threading
+from multiprocessing.pool import ThreadPool
+from sparseFrame import compactFrame
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+class FramePrefetcher(object):
+    """Reads the frames around the one being looked at in a thread pool, so Next and Save and Next are served from
+    memory instead of waiting on the disk.
+    """
+
+    def __init__(self, scanCube, ahead=3, behind=1, threads=2, cache=None):
+        """
+        :param scanCube: ScanCube or ScanContainer of the open scan
+        :param ahead: number of frames read after the current one
+        :param behind: number of frames read before the current one
+        :param threads: size of the thread pool
+        :param cache: optional FrameCache, frames already in it are not read again and frames read are added to it
+        """
+        self.scanCube = scanCube
+        self.cache = cache
+        self.ahead = ahead
+        self.behind = behind
+        self.pool = ThreadPool(threads)
+        self.pending = {}  # path -> AsyncResult
+        self.lock = threading.Lock()
+
+    def prefetch(self, i):
+        """Starts reading the neighbours of frame i and drops the frames that are no longer around it.
+        :param i: index of the current frame
+        """
+        fileList = self.scanCube.fileList
+        window = range(max(i - self.behind, 0), min(i + self.ahead + 1, len(fileList)))
+        paths = [fileList[n] for n in window if n != i]
+
+        with self.lock:
+            for path in list(self.pending):
+                if path not in paths:
+                    del self.pending[path]
+            for path in paths:
+                if path not in self.pending and not self._isCached(path):
+                    self.pending[path] = self.pool.apply_async(self._read, (path,))
+
+    def get(self, i):
+        """Returns frame i if it has been prefetched, waiting for it if the read is still running.
+        :param i: frame index
+        :return: 2D array or None
+        """
+        with self.lock:
+            result = self.pending.pop(self.scanCube.fileList[i], None)
+        if result is None:
+            return None
+        try:
+            return result.get()
+        except (IOError, OSError, ValueError) as e:
+            print(e)
+            return None
+
+    def clear(self):
+        """Forgets every prefetched frame."""
+        with self.lock:
+            self.pending = {}
+
+    def close(self):
+        """Stops the thread pool."""
+        self.clear()
+        self.pool.terminate()
+
+    def _isCached(self, path):
+        return self.cache is not None and self.cache.key(path, mtime=self.scanCube.mtime(path)) in self.cache
+
+    def _read(self, path):
+        frame = self.scanCube.reader.readFile(path)
+        if self.cache is not None:
+            self.cache.put(self.cache.key(path, mtime=self.scanCube.mtime(path)), compactFrame(frame))
+        return frame
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from scipy import ndimage
+from corrections import FrameCorrections
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+SEARCH_RADIUS = 2  # how far from a bad pixel its replacing pixel can be
+
+
+class HotPixelDetector(object):
+    """Finds hot and saturated pixels in one pass over a scan, keeping only a few maps in memory. A Bragg peak only
+    lights a pixel during part of a rocking or rod scan, while a hot pixel is bright in every frame, so pixels are
+    judged on their minimum over the scan compared with the minimum of their neighbours.
+    """
+
+    def __init__(self, shape, saturation=None, threshold=5.0, saturatedFraction=1.0):
+        """
+        :param shape: (rows, columns) of the images
+        :param saturation: counts at or above which a pixel is saturated, None to not look for saturated pixels
+        :param threshold: how many Poisson standard deviations above its neighbours a pixel must always be
+        :param saturatedFraction: fraction of the frames in which a pixel must be saturated to be flagged
+        """
+        self.shape = tuple(shape)
+        self.saturation = saturation
+        self.threshold = threshold
+        self.saturatedFraction = saturatedFraction
+        self.count = 0
+        self.minimum = np.full(self.shape, np.inf)
+        self.saturated = np.zeros(self.shape, dtype=np.int64)
+
+    @classmethod
+    def fromFrames(cls, frames, saturation=None, threshold=5.0, saturatedFraction=1.0, chunkSize=64):
+        """Scans a whole stack, read in chunks.
+        :param frames: (N, rows, columns) array, ScanCube, ScanContainer or list of 2D arrays
+        :param chunkSize: number of frames held in memory at once
+        :return: HotPixelDetector
+        """
+        detector = cls(np.shape(frames[0]), saturation, threshold, saturatedFraction)
+        for start in range(0, len(frames), chunkSize):
+            detector.update(np.array([frames[i] for i in range(start, min(start + chunkSize, len(frames)))]))
+        return detector
+
+    def update(self, frames):
+        """Adds one frame or a stack of frames.
+        :param frames: 2D image or (N, rows, columns) stack
+        """
+        frames = np.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[np.newaxis]
+        if len(frames) == 0:
+            return
+        np.minimum(self.minimum, frames.min(0), out=self.minimum)
+        if self.saturation is not None:
+            self.saturated += np.count_nonzero(frames >= self.saturation, 0)
+        self.count += len(frames)
+
+    def badPixels(self):
+        """
+        :return: 2D boolean array, True for the hot and saturated pixels
+        """
+        if self.count == 0:
+            return np.zeros(self.shape, dtype=bool)
+        valid = self.minimum >= 0  # negative pixels are module gaps, not bad pixels
+        minimum = np.where(valid, self.minimum, 0)
+        local = ndimage.median_filter(minimum, size=3, mode='nearest')
+        bad = valid & (minimum - local > self.threshold * np.sqrt(np.maximum(local, 1)))
+        if self.saturation is not None:
+            bad |= self.saturated >= self.saturatedFraction * self.count
+        return bad
+
+    def replacements(self, bad=None):
+        """Picks, for every bad pixel, the closest good pixel to copy.
+        :param bad: 2D boolean array of bad pixels, badPixels() if None
+        :return: (N, 2) array of bad (x, y), (N, 2) array of replacing (x, y); bad pixels without a good pixel around
+        them are left out
+        """
+        if bad is None:
+            bad = self.badPixels()
+        good = ~bad & (self.minimum >= 0)
+        rows, cols = np.nonzero(bad)
+        sourceRows = np.full(len(rows), -1)
+        sourceCols = np.full(len(rows), -1)
+        offsets = [(dy, dx) for dy in range(-SEARCH_RADIUS, SEARCH_RADIUS + 1)
+                   for dx in range(-SEARCH_RADIUS, SEARCH_RADIUS + 1) if dy or dx]
+        offsets.sort(key=lambda offset: offset[0] ** 2 + offset[1] ** 2)
+        for dy, dx in offsets:
+            todo = np.flatnonzero(sourceRows < 0)
+            r, c = rows[todo] + dy, cols[todo] + dx
+            inside = (r >= 0) & (r < self.shape[0]) & (c >= 0) & (c < self.shape[1])
+            todo, r, c = todo[inside], r[inside], c[inside]
+            found = good[r, c]
+            sourceRows[todo[found]] = r[found]
+            sourceCols[todo[found]] = c[found]
+
+        kept = sourceRows >= 0
+        return (np.column_stack((cols[kept], rows[kept])),
+                np.column_stack((sourceCols[kept], sourceRows[kept])))
+
+    def corrections(self, efficiency=None):
+        """
+        :param efficiency: optional flatfield efficiency map
+        :return: FrameCorrections replacing the bad pixels found
+        """
+        return FrameCorrections(self.shape, *self.replacements(), efficiency=efficiency)
+
+    def write(self, path):
+        """Writes the bad pixels in the "x,y x,y" bad pixel file format.
+        :param path: file to write
+        """
+        with open(path, 'w') as f:
+            for (bx, by), (rx, ry) in zip(*self.replacements()):
+                f.write("{},{} {},{}\n".format(bx, by, rx, ry))
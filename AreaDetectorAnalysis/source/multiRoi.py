@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from areaData import checkRoi, roiIndices
+from batchIntegration import integralsFromSums
+from summedAreaTable import SummedAreaTable, boxSums, clipBoxes, stackTables
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+MULTI_ROI_DTYPE = np.dtype([('name', 'U32'), ('I', np.float64), ('sigI', np.float64),
+                            ('peak', np.float64), ('back', np.float64)])
+
+
+class MultiRoi(object):
+    """Area integration of several named peak/background pairs on the same frame. All the areas are read from one
+    summed area table, so every roi costs eight lookups whatever its size.
+    """
+
+    def __init__(self, rois):
+        """
+        :param rois: list of (name, peak area, background area), areas given as (x center, y center, x width, y width)
+        """
+        self.names = []
+        bounds = []
+        for name, proi, broi in rois:
+            checkRoi(proi, broi)
+            px, py = roiIndices(proi)
+            bx, by = roiIndices(broi)
+            self.names.append(name)
+            bounds.append(py + px + by + bx)
+        bounds = np.array(bounds, dtype=np.intp).reshape(-1, 8)
+        self.peakBounds = bounds[:, :4].T  # y0, y1, x0, x1 of every peak area
+        self.backBounds = bounds[:, 4:].T
+
+    def __len__(self):
+        return len(self.names)
+
+    def integrate(self, img=None, sat=None, pixelMask=None, variance=None):
+        """Integrates every roi of one frame.
+        :param img: 2D image, not needed when sat is given
+        :param sat: SummedAreaTable of the image, built with pixelMask
+        :param pixelMask: optional PixelMask, the masked pixels are left out like in AreaData
+        :param variance: optional 2D pixel variances, see AreaData
+        :return: 1D array of MULTI_ROI_DTYPE, one row per roi
+        """
+        if sat is None:
+            sat = SummedAreaTable(img, pixelMask)
+        return self._integrate(sat.table, sat.shape, maskTable(pixelMask),
+                               None if variance is None else SummedAreaTable(variance, pixelMask).table)
+
+    def integrateStack(self, frames, chunkSize=64, pixelMask=None, background=None):
+        """Integrates every roi of every frame of a scan.
+        :param frames: (N, rows, columns) array, ScanCube, ScanContainer or list of 2D arrays
+        :param chunkSize: number of frames held in memory at once
+        :param pixelMask: optional PixelMask, the masked pixels are left out like in AreaData
+        :param background: optional RunningBackground subtracted from the frames, for the errors like integrateStack
+        :return: (N, number of rois) array of MULTI_ROI_DTYPE
+        """
+        masked = maskTable(pixelMask)
+        result = np.empty((len(frames), len(self)), dtype=MULTI_ROI_DTYPE)
+        for start in range(0, len(frames), chunkSize):
+            stop = min(start + chunkSize, len(frames))
+            chunk = np.array([frames[i] for i in range(start, stop)])
+            variance = None
+            if background is not None:
+                variance = background.errorVariance(chunk)
+            if pixelMask is not None:
+                chunk[:, pixelMask.masked] = 0
+                if variance is not None:
+                    variance[:, pixelMask.masked] = 0
+            result[start:stop] = self._integrate(stackTables(chunk), chunk.shape[1:], masked,
+                                                 None if variance is None else stackTables(variance))
+        return result
+
+    def _integrate(self, table, shape, masked=None, variance=None):
+        peakBounds = clipBoxes(shape, *self.peakBounds)
+        backBounds = clipBoxes(shape, *self.backBounds)
+        peakAreas, backAreas = self._areas(peakBounds), self._areas(backBounds)
+        varP = varB = None
+        if masked is not None:
+            peakAreas -= boxSums(masked, *peakBounds)
+            backAreas -= boxSums(masked, *backBounds)
+        if variance is not None:
+            varP, varB = boxSums(variance, *peakBounds), boxSums(variance, *backBounds)
+        result = np.empty(table.shape[:-2] + (len(self),), dtype=MULTI_ROI_DTYPE)
+        result['name'] = self.names
+        result['peak'] = boxSums(table, *peakBounds)
+        result['back'] = boxSums(table, *backBounds)
+        result['I'], result['sigI'] = integralsFromSums(result['peak'], result['back'], peakAreas, backAreas,
+                                                        varP, varB)
+        return result
+
+    def _areas(self, bounds):
+        y0, y1, x0, x1 = bounds
+        return ((y1 - y0) * (x1 - x0)).astype(np.float64)
+
+
+def maskTable(pixelMask):
+    """Summed area table counting the masked pixels, None without a mask."""
+    return None if pixelMask is None else SummedAreaTable(pixelMask.masked).table
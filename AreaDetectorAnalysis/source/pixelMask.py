@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from matplotlib.path import Path
+from areaData import roiIndices
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+MAX_CACHED_MASKS = 16
+MAX_CACHED_IMAGES = 4096
+_detectorMasks = {}
+_imageMasks = {}
+
+
+class PixelMask(object):
+    """Pixels left out of the integrals: module gaps and dead pixels, which Pilatus detectors mark with negative
+    values, and any rectangle or polygon the user adds. Besides the boolean image, the mask is available as flat
+    indices or packed bits.
+    """
+
+    def __init__(self, shape, masked=None):
+        """
+        :param shape: (rows, columns) of the images
+        :param masked: optional 2D boolean array, True for the masked pixels
+        """
+        self.shape = tuple(shape)
+        self.masked = np.zeros(self.shape, dtype=bool) if masked is None else np.array(masked, dtype=bool)
+        self._indices = None
+
+    @classmethod
+    def fromFrame(cls, frame):
+        """Masks the negative pixels of a frame.
+        :param frame: 2D raw image
+        :return: PixelMask
+        """
+        frame = np.asarray(frame)
+        return cls(frame.shape, frame < 0)
+
+    @classmethod
+    def fromPacked(cls, shape, bits):
+        """
+        :param shape: (rows, columns) of the images
+        :param bits: array returned by packed()
+        :return: PixelMask
+        """
+        return cls(shape, np.unpackbits(bits)[:shape[0] * shape[1]].reshape(shape))
+
+    def copy(self):
+        return PixelMask(self.shape, self.masked)
+
+    def packed(self):
+        """
+        :return: 1D uint8 array, eight pixels per byte
+        """
+        return np.packbits(self.masked)
+
+    @property
+    def indices(self):
+        """Flat indices of the masked pixels."""
+        if self._indices is None:
+            self._indices = np.flatnonzero(self.masked)
+        return self._indices
+
+    def __len__(self):
+        """Number of masked pixels."""
+        return len(self.indices)
+
+    def addRectangle(self, roi):
+        """Masks a rectangle.
+        :param roi: (x center, y center, x width, y width)
+        """
+        x, y = roiIndices(roi)
+        self.masked[max(y[0], 0):max(y[1], 0), max(x[0], 0):max(x[1], 0)] = True
+        self._indices = None
+
+    def addPolygon(self, vertices):
+        """Masks the pixels whose center is inside a polygon.
+        :param vertices: sequence of (x, y)
+        """
+        vertices = np.asarray(vertices, dtype=np.float64)
+        x0, y0 = np.maximum(np.floor(vertices.min(0)).astype(int), 0)
+        x1, y1 = np.ceil(vertices.max(0)).astype(int) + 1
+        ys, xs = np.mgrid[y0:min(y1, self.shape[0]), x0:min(x1, self.shape[1])]
+        inside = Path(vertices).contains_points(np.column_stack((xs.ravel(), ys.ravel())))
+        self.masked[ys.ravel()[inside], xs.ravel()[inside]] = True
+        self._indices = None
+
+
+def detectorMask(frame, image=None):
+    """Mask of the negative pixels of a frame. Frames with the same gaps and dead pixels, normally every frame of a
+    detector, share one PixelMask, which must be copied before shapes are added to it.
+    :param frame: 2D raw image, or a function returning it, called only when the mask of the image isn't cached
+    :param image: optional (path, mtime) of the frame, the mask of an image seen before is returned without looking
+    at its pixels
+    :return: PixelMask
+    """
+    mask = _imageMasks.get(image) if image is not None else None
+    if mask is not None:
+        return mask
+
+    masked = np.asarray(frame() if callable(frame) else frame) < 0
+    key = (masked.shape, np.packbits(masked).tobytes())
+    mask = _detectorMasks.get(key)
+    if mask is None:
+        if len(_detectorMasks) >= MAX_CACHED_MASKS:
+            _detectorMasks.clear()
+        mask = _detectorMasks[key] = PixelMask(masked.shape, masked)
+    if image is not None:
+        if len(_imageMasks) >= MAX_CACHED_IMAGES:
+            _imageMasks.clear()
+        _imageMasks[image] = mask
+    return mask
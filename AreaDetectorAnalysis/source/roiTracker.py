@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from areaData import checkRoi, roiIndices
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+MOMENTS_DTYPE = np.dtype([('total', np.float64), ('x', np.float64), ('y', np.float64),
+                          ('xx', np.float64), ('yy', np.float64), ('xy', np.float64)])
+
+
+def peakMoments(frames, window, chunkSize=256):
+    """Centroid and second moments (variances and covariance) of the peak of every frame inside a search window. A
+    flat background, the median of the pixels on the edge of the window, is subtracted first and only the counts
+    above it weigh. Negative pixels (module gaps) weigh nothing, frames with nothing above the background get nan.
+    :param frames: (N, rows, columns) array, ScanCube, ScanContainer or list of 2D arrays
+    :param window: search area (x center, y center, x width, y width)
+    :param chunkSize: number of frames held in memory at once
+    :return: 1D array of MOMENTS_DTYPE, one row per frame
+    """
+    wx, wy = windowIndices(np.shape(frames[0]), window)
+    result = np.empty(len(frames), dtype=MOMENTS_DTYPE)
+    for start in range(0, len(frames), chunkSize):
+        stop = min(start + chunkSize, len(frames))
+        w = np.array([frames[i][wy[0]:wy[1], wx[0]:wx[1]] for i in range(start, stop)], dtype=np.float64)
+        result[start:stop] = windowMoments(w, wx, wy)
+    return result
+
+
+def windowIndices(shape, window):
+    """Pixel bounds of a search window, clipped to the detector.
+    :param shape: (rows, columns) of the frames
+    :param window: (x center, y center, x width, y width)
+    :return: [x0, x1], [y0, y1]
+    """
+    wx, wy = roiIndices(window)
+    return [min(max(v, 0), shape[1]) for v in wx], [min(max(v, 0), shape[0]) for v in wy]
+
+
+def windowMoments(w, wx, wy):
+    """Moments of a stack of windows, see peakMoments.
+    :param w: (N, rows, columns) float64 windows, overwritten
+    :param wx: x bounds of the windows in the frames
+    :param wy: y bounds of the windows in the frames
+    :return: 1D array of MOMENTS_DTYPE
+    """
+    result = np.full(len(w), np.nan, dtype=MOMENTS_DTYPE)
+    if w.size == 0:
+        result['total'] = 0
+        return result
+
+    w[w < 0] = np.nan
+    edge = np.concatenate((w[:, 0, :], w[:, -1, :], w[:, :, 0], w[:, :, -1]), 1)
+    level = [np.median(e[~np.isnan(e)]) if not np.isnan(e).all() else 0. for e in edge]
+    w -= np.reshape(level, (-1, 1, 1))
+    w[~(w > 0)] = 0  # below the background or in a gap
+
+    xs = np.arange(wx[0], wx[1], dtype=np.float64)
+    ys = np.arange(wy[0], wy[1], dtype=np.float64)
+    xProfile = w.sum(1)
+    yProfile = w.sum(2)
+    result['total'] = total = xProfile.sum(1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result['x'] = x = np.dot(xProfile, xs) / total
+        result['y'] = y = np.dot(yProfile, ys) / total
+        result['xx'] = np.dot(xProfile, xs ** 2) / total - x ** 2
+        result['yy'] = np.dot(yProfile, ys ** 2) / total - y ** 2
+        result['xy'] = np.einsum('nij,i,j->n', w, ys, xs) / total - x * y
+    return result
+
+
+def trackRois(frames, proi, broi, window=None):
+    """Follows a drifting peak through a scan. The search window starts where it is given and, for each frame, is
+    moved by whole pixels onto the centroid found in the previous frame, so a peak drifting further than the window
+    is still followed. The peak and background areas are moved together, by whole pixels, so that the peak area is
+    centered on the centroid of each frame. A frame without a peak keeps the position of the previous one and the
+    background area never leaves the detector.
+    :param frames: (N, rows, columns) array, ScanCube, ScanContainer or list of 2D arrays
+    :param proi: peak area (x center, y center, x width, y width)
+    :param broi: background area, same format
+    :param window: search area, the background area if None
+    :return: (N, 4) peak areas, (N, 4) background areas, moments of every frame (see peakMoments)
+    """
+    checkRoi(proi, broi)
+    shape = np.shape(frames[0])
+    rows, cols = shape
+    window = np.array(broi if window is None else window, dtype=np.float64)
+    moments = np.empty(len(frames), dtype=MOMENTS_DTYPE)
+    for i in range(len(frames)):
+        wx, wy = windowIndices(shape, window)
+        w = np.array(frames[i][wy[0]:wy[1], wx[0]:wx[1]], dtype=np.float64)
+        moments[i] = windowMoments(w[np.newaxis], wx, wy)[0]
+        if np.isfinite(moments['x'][i]) and np.isfinite(moments['y'][i]):
+            window[0] += np.round(moments['x'][i] - window[0])
+            window[1] += np.round(moments['y'][i] - window[1])
+    bx, by = roiIndices(broi)
+
+    shifts = []
+    for axis, center, (low, high), length in (('x', proi[0], bx, cols), ('y', proi[1], by, rows)):
+        position = moments[axis]
+        found = np.isfinite(position)
+        if not found.any():
+            shifts.append(np.zeros(len(moments), dtype=int))
+            continue
+        last = np.maximum.accumulate(np.where(found, np.arange(len(moments)), -1))  # previous frame with a peak
+        position = np.where(last >= 0, position[np.maximum(last, 0)], position[found][0])
+        shifts.append(np.clip(np.round(position - center), -low, length - high).astype(int))
+
+    # whole pixel shifts added to the rois as given, so the boxes stay on the grid AreaData uses for them
+    peakRois = np.tile(np.asarray(proi), (len(moments), 1))
+    backRois = np.tile(np.asarray(broi), (len(moments), 1))
+    for rois in (peakRois, backRois):
+        rois[:, 0] += shifts[0]
+        rois[:, 1] += shifts[1]
+    return peakRois, backRois, moments
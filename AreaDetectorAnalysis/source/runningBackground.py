@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+BACKGROUND_METHODS = ('mean', 'median')
+
+
+class RunningBackground(object):
+    """Per pixel background of a scan built one frame at a time, so memory doesn't grow with the scan length. The
+    mean and variance are updated with Welford's algorithm; the median is approximated by moving the estimate of
+    every pixel towards each new value by a step that scales with the pixel's mean absolute deviation and shrinks as
+    frames are added.
+    """
+
+    def __init__(self, shape, method='mean', medianStep=1.0):
+        """
+        :param shape: (rows, columns) of the images
+        :param method: 'mean' or 'median', the statistic subtracted from the images
+        :param medianStep: step of the median estimate, in mean absolute deviations
+        """
+        if method not in BACKGROUND_METHODS:
+            raise ValueError("Background method must be one of " + ", ".join(BACKGROUND_METHODS) + ".")
+        self.shape = tuple(shape)
+        self.method = method
+        self.medianStep = medianStep
+        self.count = 0
+        self.mean = np.zeros(self.shape, dtype=np.float64)
+        self.m2 = np.zeros(self.shape, dtype=np.float64)
+        self.median = None
+        self.deviation = None  # running mean absolute deviation from the median estimate
+
+    @classmethod
+    def fromFrames(cls, frames, method='mean', medianStep=1.0, chunkSize=64):
+        """Background of a whole scan, read in chunks.
+        :param frames: (N, rows, columns) array, ScanCube, ScanContainer or list of 2D arrays
+        :param method: 'mean' or 'median'
+        :param medianStep: step of the median estimate, in mean absolute deviations
+        :param chunkSize: number of frames held in memory at once
+        :return: RunningBackground
+        """
+        background = cls(np.shape(frames[0]), method, medianStep)
+        for start in range(0, len(frames), chunkSize):
+            background.update(np.array([frames[i] for i in range(start, min(start + chunkSize, len(frames)))]))
+        return background
+
+    @property
+    def variance(self):
+        return self.m2 / max(self.count - 1, 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def background(self):
+        """The statistic subtracted from the images."""
+        return self.median if self.method == 'median' else self.mean
+
+    def _estimateScale(self):
+        """Factor from m2 to the variance of the background estimate, pi/2 times that of the mean for the median."""
+        scale = 1.0 / (max(self.count - 1, 1) * max(self.count, 1))
+        return scale * (np.pi / 2) if self.method == 'median' else scale
+
+    def update(self, frames):
+        """Adds one frame or a stack of frames.
+        :param frames: 2D image or (N, rows, columns) stack
+        """
+        frames = np.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[np.newaxis]
+        if self.method == 'median':
+            for frame in frames:
+                self._merge(1, frame.astype(np.float64), 0.0)
+                self._updateMedian(frame)
+        elif len(frames):
+            # Chan et al. merge of the statistics of the chunk with the running ones
+            mean = np.mean(frames, 0, dtype=np.float64)
+            m2 = np.sum((frames - mean) ** 2, 0)
+            self._merge(len(frames), mean, m2)
+
+    def _merge(self, count, mean, m2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * (float(count) / total)
+        self.m2 += m2 + delta ** 2 * (float(self.count) * count / total)
+        self.count = total
+
+    def _updateMedian(self, frame):
+        if self.median is None:
+            self.median = frame.astype(np.float64)
+            self.deviation = np.zeros(self.shape, dtype=np.float64)
+            return
+        step = self.medianStep * np.maximum(self.deviation, 1.0) / np.sqrt(self.count)
+        self.median += step * np.sign(frame - self.median)
+        self.deviation += (np.abs(frame - self.median) - self.deviation) / self.count
+
+    def subtract(self, frame, out=None):
+        """Removes the background from a frame or a stack of frames. Pixels below the background stay negative, so
+        that the integrals are not biased; their errors come from errorVariance.
+        :param frame: 2D image or (N, rows, columns) stack
+        :param out: array that receives the result
+        :return: float64 array
+        """
+        return np.subtract(frame, self.background, out=out, dtype=np.float64)
+
+    def errorVariance(self, subtracted, region=Ellipsis):
+        """Variance of the pixels of background subtracted frames: the Poisson variance of the counts before the
+        subtraction plus the variance of the background estimate.
+        :param subtracted: frame or stack of frames returned by subtract, or a region of them
+        :param region: index of the region of the images the pixels come from, (rows slice, columns slice)
+        :return: float64 array, same shape as subtracted
+        """
+        out = np.add(subtracted, self.background[region], dtype=np.float64)
+        np.maximum(out, 0, out=out)  # gap and dead pixels, negative before the subtraction
+        out += self.m2[region] * self._estimateScale()
+        return out
+
+
+class SubtractedFrames(object):
+    """Frames of a scan with a background removed when they are read, so that batch integration can use them like
+    any other stack. Give the background to integrateStack as well for the errors.
+    """
+
+    def __init__(self, frames, background):
+        """
+        :param frames: (N, rows, columns) array, ScanCube, ScanContainer or list of 2D arrays
+        :param background: RunningBackground
+        """
+        self.frames = frames
+        self.background = background
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, i):
+        return self.background.subtract(self.frames[i])
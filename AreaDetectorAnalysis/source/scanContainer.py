@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import numpy as np
+from scanCube import FrameStack, ScanCube
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+CONTAINER_EXTENSIONS = ('.h5', '.hdf5', '.nxs')
+SEPARATOR = '::'  # between the container path and the frame name in ScanContainer.fileList
+
+#  Locations inside the container
+DATA_PATH = 'entry/data/data'
+NAMES_PATH = 'entry/data/frame_names'
+SPEC_PATH = 'entry/spec'
+
+
+def isContainer(path):
+    """Whether a path is a scan container file.
+    :param path: file path
+    :return: bool
+    """
+    return os.path.isfile(path) and path.lower().endswith(CONTAINER_EXTENSIONS)
+
+
+def _requireH5py():
+    if h5py is None:
+        raise ImportError("h5py is needed to read and write HDF5 scan containers.")
+
+
+def convertScan(fileList, containerFile, specScan=None, compression='gzip', compressionLevel=4):
+    """Packs the images of one scan into a single NeXus/HDF5 file. Each frame is one chunk.
+    :param fileList: image paths in scan order
+    :param containerFile: path of the file to write
+    :param specScan: optional spec2nexus scan, its data columns are written under entry/spec
+    :param compression: 'gzip', 'lzf' or None for no compression
+    :param compressionLevel: gzip level
+    :return: ScanContainer opened on the new file
+    """
+    _requireH5py()
+    cube = ScanCube(fileList)
+    options = {}
+    if compression == 'gzip':
+        options = {'compression': 'gzip', 'compression_opts': compressionLevel, 'shuffle': True}
+    elif compression is not None:
+        options = {'compression': compression, 'shuffle': True}
+
+    buf = np.empty(cube.frameShape, dtype=cube.dtype.newbyteorder('='))
+    with h5py.File(containerFile, 'w') as f:
+        entry = f.create_group('entry')
+        entry.attrs['NX_class'] = 'NXentry'
+        data = entry.create_group('data')
+        data.attrs['NX_class'] = 'NXdata'
+        data.attrs['signal'] = 'data'
+        dset = data.create_dataset('data', shape=(len(cube),) + cube.frameShape, dtype=buf.dtype,
+                                   chunks=(1,) + cube.frameShape, **options)
+        for i in range(len(cube)):
+            dset[i] = cube.read(i, buf)
+        names = [os.path.basename(path).encode('utf-8') for path in fileList]
+        data.create_dataset('frame_names', data=np.array(names))
+
+        if specScan is not None:
+            spec = entry.create_group('spec')
+            spec.attrs['NX_class'] = 'NXcollection'
+            spec.attrs['scan'] = str(specScan.scanNum)
+            spec.attrs['S'] = specScan.S
+            for key, column in specScan.data.items():
+                spec.create_dataset(key, data=np.asarray(column, dtype=np.float64))
+
+    return ScanContainer(containerFile)
+
+
+class ScanContainer(FrameStack):
+    """Reads a scan written by convertScan. It has the same interface as ScanCube, so the GUI and batch processing
+    open one file instead of a directory of images.
+    """
+
+    def __init__(self, containerFile):
+        """
+        :param containerFile: path of the HDF5 file
+        """
+        _requireH5py()
+        self.containerFile = containerFile
+        self.h5 = h5py.File(containerFile, 'r')
+        self.data = self.h5[DATA_PATH]
+        self.dtype = self.data.dtype
+        self.frameShape = self.data.shape[1:]
+        self.reader = self
+
+        names = [n.decode('utf-8') if isinstance(n, bytes) else n for n in self.h5[NAMES_PATH][()]]
+        self.fileList = [containerFile + SEPARATOR + n for n in names]
+        self.frameIndex = dict((path, i) for i, path in enumerate(self.fileList))
+
+    @property
+    def imageNames(self):
+        return [path.split(SEPARATOR)[-1] for path in self.fileList]
+
+    def frame(self, i):
+        """Reads frame i, one chunk.
+        :param i: frame index
+        :return: 2D array
+        """
+        return self.data[self.frameIndex[self.fileList[i]]]
+
+    def read(self, i, out=None):
+        """Reads frame i of the scan, see ScanCube.read.
+        """
+        return self.readFile(self.fileList[i], out)
+
+    def readFile(self, path, out=None):
+        """Reads one frame by the name given to it in self.fileList.
+        """
+        if out is None:
+            out = np.empty(self.frameShape, dtype=self.dtype)
+        self.data.read_direct(out, np.s_[self.frameIndex[path]])
+        return out
+
+    def mtime(self, path):
+        return os.path.getmtime(self.containerFile)
+
+    def specData(self):
+        """Spec columns stored with the scan.
+        :return: dictionary of 1D arrays, empty if there are none
+        """
+        if SPEC_PATH not in self.h5:
+            return {}
+        return dict((key, column[()]) for key, column in self.h5[SPEC_PATH].items())
+
+    def close(self):
+        self.h5.close()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+from abc import ABCMeta, abstractmethod
+import numpy as np
+from scanIndex import indexImageDirectory
+from tiffReader import TiffFrameReader
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+class FrameStack(ABCMeta(str('FrameStackBase'), (object,), {})):  # abstract on Python 2 and 3
+    """Interface of the scans seen as one (N, rows, columns) array, implemented by ScanCube and ScanContainer.
+    Subclasses set fileList, dtype and frameShape and implement frame, read and mtime.
+    """
+
+    @property
+    def shape(self):
+        return (len(self.fileList),) + self.frameShape
+
+    @property
+    def ndim(self):
+        return 3
+
+    def __len__(self):
+        return len(self.fileList)
+
+    def __iter__(self):
+        for i in range(len(self.fileList)):
+            yield self.frame(i)
+
+    def __getitem__(self, key):
+        """Supports stack[i], stack[i, rows, columns] and stack[start:stop:step, ...]. Several frames are stacked into
+        a new array.
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        frames, pixels = key[0], key[1:]
+
+        if isinstance(frames, slice):
+            return np.array([self.frame(i)[pixels] for i in range(*frames.indices(len(self)))], dtype=self.dtype)
+        elif np.ndim(frames) == 1:
+            return np.array([self.frame(i)[pixels] for i in frames], dtype=self.dtype)
+        return self.frame(frames)[pixels]
+
+    @abstractmethod
+    def frame(self, i):
+        """Image i of the scan, without a copy when possible.
+        :param i: frame index
+        :return: 2D array, not to be modified
+        """
+
+    @abstractmethod
+    def read(self, i, out=None):
+        """Reads image i of the scan into memory, for callers that modify the pixels.
+        :param i: frame index
+        :param out: optional array to read into
+        :return: writable 2D array
+        """
+
+    @abstractmethod
+    def mtime(self, path):
+        """Modification time of an image, for the frame cache keys.
+        :param path: image path
+        :return: float
+        """
+
+    def sum(self, region=None):
+        """Integrates the images over the whole scan.
+        :param region: optional (y0, y1, x0, x1) pixel bounds
+        :return: 2D float64 array
+        """
+        pixels = self._regionSlices(region)
+        total = None
+        for img in self:
+            if total is None:
+                total = np.zeros(img[pixels].shape, dtype=np.float64)
+            np.add(total, img[pixels], out=total)
+        return total
+
+    def projection(self, axis, region=None):
+        """Projects every image of the scan onto one of its axes.
+        :param axis: 1 sums the rows (one value per column), 2 sums the columns (one value per row)
+        :param region: optional (y0, y1, x0, x1) pixel bounds
+        :return: 2D float64 array, one profile per frame
+        """
+        if axis not in (1, 2):
+            raise ValueError("Projection axis must be 1 or 2.")
+        pixels = self._regionSlices(region)
+        return np.array([np.sum(img[pixels], axis - 1, dtype=np.float64) for img in self])
+
+    def frameSums(self, region=None):
+        """Total counts of every frame.
+        :param region: optional (y0, y1, x0, x1) pixel bounds
+        :return: 1D float64 array
+        """
+        pixels = self._regionSlices(region)
+        return np.array([np.sum(img[pixels], dtype=np.float64) for img in self])
+
+    def close(self):
+        """Releases the files the stack keeps open, stacks that open an image at each read have nothing to do.
+        """
+
+    def _regionSlices(self, region):
+        if region is None:
+            return (slice(None), slice(None))
+        return (slice(region[0], region[1]), slice(region[2], region[3]))
+
+
+class ScanCube(FrameStack):
+    """Exposes the images of a scan as one (N, rows, columns) array. Every frame is a read only np.memmap onto the
+    pixel strip of its TIFF file, so selecting, summing or projecting frames never decodes or copies an image.
+    Images that can't be mapped are decoded by the TiffFrameReader.
+    """
+
+    def __init__(self, fileList):
+        """
+        :param fileList: list of image paths in scan order. The list is kept by reference, so frames removed from it
+        are removed from the cube as well.
+        """
+        if len(fileList) == 0:
+            raise ValueError("The scan doesn't have any images.")
+
+        self.fileList = fileList
+        self.reader = TiffFrameReader(fileList)
+        self.layout = self.reader.layout
+        if self.layout is None:
+            first = self.reader.read(0)
+            self.dtype = first.dtype
+            self.frameShape = first.shape
+        else:
+            self.dtype = self.layout.dtype
+            self.frameShape = self.layout.shape
+
+    @classmethod
+    def fromDirectory(cls, imgDir):
+        """Creates the cube from every TIFF image in a directory, ordered by frame number.
+        :param imgDir: images directory
+        :return: ScanCube
+        """
+        return cls(list(indexImageDirectory(imgDir)['path']))
+
+    def frame(self, i):
+        """Maps image i of the scan.
+        :param i: frame index
+        :return: read only 2D np.memmap, or the decoded image if it doesn't have the scan layout
+        """
+        if not self.reader.isNative(self.fileList[i]):
+            return self.reader.read(i)
+        return np.memmap(self.fileList[i], dtype=self.dtype, mode='r', offset=self.layout.offset,
+                         shape=self.frameShape)
+
+    def read(self, i, out=None):
+        """Reads image i of the scan into memory, for callers that modify the pixels.
+        :param i: frame index
+        :param out: optional array to read into
+        :return: writable 2D array
+        """
+        return self.reader.read(i, out)
+
+    def mtime(self, path):
+        """Modification time of an image, used to key the frame cache.
+        :param path: image path
+        :return: float
+        """
+        return os.path.getmtime(path)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import re
+import numpy as np
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+IMAGE_EXTENSIONS = ('.tif', '.tiff')
+FRAME_NUMBER = re.compile(r'(\d+)\.[^.]+$')  # digits right before the extension, AGBO1_1_S064_00012.tif -> 12
+DIGITS = re.compile(r'(\d+)')
+
+FRAME_TABLE_DTYPE = np.dtype([('frame', np.int64), ('row', np.int64), ('size', np.int64), ('mtime', np.float64),
+                              ('path', object)])
+
+
+def frameNumber(name):
+    """Parses the frame number written by the detector in an image name.
+    :param name: image name or path
+    :return: int, or -1 if the name doesn't end with a number
+    """
+    match = FRAME_NUMBER.search(name)
+    return int(match.group(1)) if match else -1
+
+
+def naturalKey(name):
+    """Sort key that orders the numbers inside a name by value, so 'S64_2' comes before 'S64_10'.
+    :param name: image name or path
+    :return: list
+    """
+    return [int(part) if part.isdigit() else part.lower() for part in DIGITS.split(name)]
+
+
+def firstFrame(names):
+    """Frame number of the first image of a scan.
+    :param names: image names
+    :return: int, or None if some name doesn't end with a number
+    """
+    frames = [frameNumber(name) for name in names]
+    if len(frames) == 0 or -1 in frames:
+        return None
+    return min(frames)
+
+
+def frameRows(names, rowCount=None, first=None):
+    """Spec data row of each image. Detectors number the images of a scan from 0 or from 1, so the row is the frame
+    number counted from the first frame. Names without a number fall back to their position.
+    :param names: image names in scan order
+    :param rowCount: number of data rows of the scan in the spec file, images past them get row -1
+    :param first: frame number of the first image, by default the smallest frame number in names. Give it when
+    adding images to a scan already open.
+    :return: list of int
+    """
+    frames = [frameNumber(name) for name in names]
+    if -1 in frames:
+        rows = list(range(len(names)))
+    else:
+        if first is None:
+            first = firstFrame(names)
+        rows = [frame - first for frame in frames]
+    if rowCount is not None:
+        rows = [row if 0 <= row < rowCount else -1 for row in rows]
+    return rows
+
+
+def indexImageDirectory(imgDir):
+    """Lists the images of a scan with a single scandir pass and orders them by frame number.
+    :param imgDir: images directory
+    :return: 1D array of FRAME_TABLE_DTYPE in scan order
+    """
+    entries = []
+    for entry in scandir(imgDir):
+        if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+            stat = entry.stat()
+            entries.append((frameNumber(entry.name), entry.name, stat.st_size, stat.st_mtime, entry.path))
+
+    entries.sort(key=lambda e: (e[0], naturalKey(e[1])))
+    table = np.empty(len(entries), dtype=FRAME_TABLE_DTYPE)
+    if len(entries) != 0:
+        frames, names, sizes, mtimes, paths = zip(*entries)
+        table['frame'] = frames
+        table['row'] = frameRows(names)
+        table['size'] = sizes
+        table['mtime'] = mtimes
+        table['path'] = paths
+    return table
+
+
+def missingFrames(table):
+    """Frame numbers absent from a scan, between its first and last image.
+    :param table: array returned by indexImageDirectory
+    :return: 1D int array
+    """
+    frames = table['frame'][table['frame'] >= 0]
+    if len(frames) == 0:
+        return np.array([], dtype=np.int64)
+    return np.setdiff1d(np.arange(frames[0], frames[-1] + 1), frames)
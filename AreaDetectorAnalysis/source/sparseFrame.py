@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+MAX_RELATIVE_SIZE = 0.5  # frames are kept sparse when it at least halves their memory
+
+
+class SparseFrame(object):
+    """Detector image stored as its nonzero pixels, row by row (CSR). Frames around a Bragg peak are mostly empty,
+    so a scan kept this way takes memory in proportion to the pixels that counted rather than to the detector size.
+    Negative pixels (module gaps) are nonzero and are kept.
+    """
+
+    def __init__(self, shape, indptr, indices, data):
+        """
+        :param shape: (rows, columns) of the detector image
+        :param indptr: data[indptr[r]:indptr[r + 1]] are the pixels of row r
+        :param indices: column of each stored pixel
+        :param data: value of each stored pixel
+        """
+        self.shape = tuple(shape)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.dtype = data.dtype
+
+    @classmethod
+    def fromDense(cls, img):
+        """Compresses a 2D image.
+        :param img: 2D array
+        :return: SparseFrame
+        """
+        img = np.asarray(img)
+        rows, cols = np.nonzero(img)
+        indptr = np.zeros(img.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=img.shape[0]), out=indptr[1:])
+        return cls(img.shape, indptr, cols.astype(np.int32), img[rows, cols])
+
+    @classmethod
+    def fromStack(cls, frames):
+        """Compresses every frame of a scan while loading it, one frame in memory at a time.
+        :param frames: iterable of 2D arrays, e.g. a ScanCube
+        :return: list of SparseFrame
+        """
+        return [cls.fromDense(img) for img in frames]
+
+    def setflags(self, write=None):
+        """Makes the stored arrays read only, like ndarray.setflags, for frames shared through the frame cache."""
+        for array in (self.indptr, self.indices, self.data):
+            array.setflags(write=write)
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def toDense(self):
+        """
+        :return: 2D array
+        """
+        return self.crop(0, self.shape[0], 0, self.shape[1])
+
+    def crop(self, y0, y1, x0, x1):
+        """Expands a rectangle of the image.
+        :param y0, y1: first and last + 1 rows
+        :param x0, x1: first and last + 1 columns
+        :return: 2D array of shape (y1 - y0, x1 - x0)
+        """
+        y0, y1 = max(y0, 0), min(y1, self.shape[0])
+        x0, x1 = max(x0, 0), min(x1, self.shape[1])
+        out = np.zeros((max(y1 - y0, 0), max(x1 - x0, 0)), dtype=self.dtype)
+        if out.size == 0:
+            return out
+        rows, cols, values = self._band(y0, y1, x0, x1)
+        out[rows - y0, cols - x0] = values
+        return out
+
+    def sum(self, y0, y1, x0, x1, dtype=np.float64, masked=None):
+        """Sums a rectangle of the image without expanding it.
+        :param masked: optional boolean array over the rectangle, True for the pixels left out
+        :return: float
+        """
+        return np.sum(self._band(y0, y1, x0, x1, masked)[2], dtype=dtype)
+
+    def profile(self, axis, y0, y1, x0, x1, dtype=np.float64, masked=None):
+        """Sums a rectangle of the image along one axis, like np.sum(img[y0:y1, x0:x1], axis).
+        :param axis: 0 gives one value per column, 1 one value per row
+        :param masked: optional boolean array over the rectangle, True for the pixels left out
+        :return: 1D array
+        """
+        y0, y1 = max(y0, 0), min(y1, self.shape[0])
+        x0, x1 = max(x0, 0), min(x1, self.shape[1])
+        rows, cols, values = self._band(y0, y1, x0, x1, masked)
+        if axis == 0:
+            return np.bincount(cols - x0, weights=values, minlength=max(x1 - x0, 0)).astype(dtype)
+        return np.bincount(rows - y0, weights=values, minlength=max(y1 - y0, 0)).astype(dtype)
+
+    def size(self, y0, y1, x0, x1):
+        """Number of pixels of the image in the rectangle.
+        :return: int
+        """
+        return max(min(y1, self.shape[0]) - max(y0, 0), 0) * max(min(x1, self.shape[1]) - max(x0, 0), 0)
+
+    def _band(self, y0, y1, x0, x1, masked=None):
+        """Stored pixels inside the rectangle.
+        :param masked: optional boolean array over the rectangle (clipped to the image), True for the pixels left out
+        :return: rows, columns and values
+        """
+        y0 = min(max(y0, 0), self.shape[0])
+        y1 = max(min(y1, self.shape[0]), y0)
+        start, stop = self.indptr[y0], self.indptr[y1]
+        cols = self.indices[start:stop]
+        rows = np.repeat(np.arange(y0, y1), np.diff(self.indptr[y0:y1 + 1]))
+        inside = (cols >= x0) & (cols < x1)
+        rows, cols, values = rows[inside], cols[inside], self.data[start:stop][inside]
+        if masked is not None:
+            kept = ~masked[rows - y0, cols - max(x0, 0)]
+            rows, cols, values = rows[kept], cols[kept], values[kept]
+        return rows, cols, values
+
+
+def compactFrame(img, maxRelativeSize=MAX_RELATIVE_SIZE):
+    """Stores a frame as a SparseFrame when few of its pixels counted, as it is loaded.
+    :param img: 2D array
+    :param maxRelativeSize: largest size of the sparse form, as a fraction of the size of img, for it to be used
+    :return: SparseFrame, or img when it is too dense to gain from it
+    """
+    img = np.asarray(img)
+    nnz = np.count_nonzero(img)
+    sparseBytes = nnz * (img.dtype.itemsize + np.dtype(np.int32).itemsize) + (img.shape[0] + 1) * 8
+    if sparseBytes > maxRelativeSize * img.nbytes:
+        return img
+    return SparseFrame.fromDense(img)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import numpy as np
+from spec2nexus.spec import SpecDataFileHeader, SpecDataFileScan
+from correctionFiles import isSidecar, loadSidecar
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+INDEX_DTYPE = np.dtype([('key', 'S8'), ('scan', np.int64), ('start', np.int64), ('stop', np.int64)])
+SECTION_KEYS = (b'#F', b'#E', b'#S')  # lines that start a header (#F, #E) or a scan (#S), like spec2nexus
+LINE_KEYS = (b'#O', b'#G', b'#UE')  # lines whose position is kept as well
+
+
+def isSpecFile(path):
+    """Whether a file is a spec file, its first line opening a header or a scan.
+    :param path: file path
+    :return: bool
+    """
+    try:
+        with open(path, 'rb') as f:
+            line = f.readline(256)
+    except (IOError, OSError):
+        return False
+    return line.lstrip().startswith(SECTION_KEYS)
+
+
+def findSpecFiles(folder):
+    """Spec files of a work directory. The index sidecars are written next to the spec file, so they, and any other
+    file that isn't a spec file, are left out.
+    :param folder: work directory
+    :return: sorted list of paths
+    """
+    paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if not isSidecar(name)]
+    return [path for path in paths if os.path.isfile(path) and isSpecFile(path)]
+
+
+def parseSpecIndex(specFile):
+    """Reads a spec file once and records where each header, scan, #O, #G and #UE line starts and stops.
+    :param specFile: spec file path
+    :return: 1D array of INDEX_DTYPE, in file order. scan is the scan number of #S sections and of the lines inside a
+    scan, -1 otherwise.
+    """
+    entries = []
+    section = None
+    scan = -1
+    offset = 0
+    with open(specFile, 'rb') as f:
+        for line in f:
+            if line.lstrip().startswith(b'#'):
+                key = line.split(None, 1)[0]
+                if key in SECTION_KEYS:
+                    if section is not None:
+                        section[3] = offset
+                    scan = -1
+                    if key == b'#S':
+                        try:
+                            scan = int(line.split()[1])
+                        except (IndexError, ValueError):
+                            pass
+                    section = [key, scan, offset, -1]
+                    entries.append(section)
+                elif key.startswith(LINE_KEYS):
+                    entries.append([key, scan, offset, offset + len(line)])
+            offset += len(line)
+    if section is not None:
+        section[3] = offset
+    return np.array([tuple(entry) for entry in entries], dtype=INDEX_DTYPE)
+
+
+class SpecIndex(object):
+    """Byte offsets of the headers and scans of a spec file, kept in a sidecar next to it. Only the scan asked for,
+    and its header, are read and parsed, so the cost of opening a scan doesn't depend on the size of the file.
+    """
+
+    def __init__(self, specFile):
+        """
+        :param specFile: spec file path
+        """
+        self.specFile = specFile
+        self.entries = loadSidecar(specFile, parseSpecIndex)
+        self.scanEntries = np.flatnonzero(self.entries['key'] == b'#S')
+        self.headerEntries = np.flatnonzero((self.entries['key'] == b'#F') | (self.entries['key'] == b'#E'))
+
+    def scanNumbers(self):
+        """
+        :return: list of the scan numbers, in file order
+        """
+        return [int(n) for n in self.entries['scan'][self.scanEntries]]
+
+    def getMaxScanNumber(self):
+        numbers = self.entries['scan'][self.scanEntries]
+        return int(numbers.max()) if len(numbers) else 0
+
+    def _scanEntry(self, scanNumber):
+        """Index entry of a scan, the first one when the number is repeated in the file."""
+        found = self.scanEntries[self.entries['scan'][self.scanEntries] == int(scanNumber)]
+        if len(found) == 0:
+            raise KeyError("Scan " + str(scanNumber) + " is not in " + self.specFile)
+        return found[0]
+
+    def _headerEntry(self, entry):
+        """Index entry of the header in effect at an entry, None if the file has no header before it."""
+        before = self.headerEntries[self.headerEntries < entry]
+        return before[-1] if len(before) else None
+
+    def _read(self, entry):
+        """Text of an entry, with its lines joined the way spec2nexus joins the lines of a section."""
+        with open(self.specFile, 'rb') as f:
+            f.seek(int(self.entries['start'][entry]))
+            buf = f.read(int(self.entries['stop'][entry] - self.entries['start'][entry]))
+        return '\n'.join(buf.decode('utf-8', 'replace').splitlines())
+
+    def header(self, scanNumber):
+        """Parses the header in effect for a scan.
+        :param scanNumber: scan number
+        :return: SpecDataFileHeader
+        """
+        entry = self._headerEntry(self._scanEntry(scanNumber))
+        header = SpecDataFileHeader('' if entry is None else self._read(entry))
+        header.file = self.specFile
+        if entry is not None:
+            if self.entries['key'][entry] == b'#E':
+                epoch = header.raw.splitlines()[0].split()[1]
+                header.epoch = float(epoch) if '.' in epoch else int(epoch)
+            header.interpret()
+        return header
+
+    def scan(self, scanNumber):
+        """Parses one scan, seeking straight to it.
+        :param scanNumber: scan number
+        :return: SpecDataFileScan, its header in scan.header
+        """
+        entry = self._scanEntry(scanNumber)
+        buf = self._read(entry)
+        scan = SpecDataFileScan(self.header(scanNumber), buf)
+        scan.specFile = self.specFile
+        scan.S = buf.splitlines()[0].strip().split(None, 1)[1]
+        scan.scanNum = scan.S.split()[0]
+        scan.scanCmd = scan.S.split(None, 1)[1] if len(scan.S.split(None, 1)) > 1 else ''
+        return scan
+
+    def headerLine(self, scanNumber, key):
+        """Gets a line, #O0 for instance, from the header of a scan without parsing the header. Falls back on the
+        first such line of the file when the header of the scan has none.
+        :param scanNumber: scan number
+        :param key: control key of the line
+        :return: line text, None if the file has no such line
+        """
+        matches = np.flatnonzero(self.entries['key'] == key.encode('ascii'))
+        header = self._headerEntry(self._scanEntry(scanNumber))
+        if header is not None:
+            inHeader = matches[(matches > header) & (self.entries['start'][matches] < self.entries['stop'][header])]
+            if len(inHeader):
+                matches = inHeader
+        if len(matches) == 0:
+            return None
+        return self._read(matches[0])
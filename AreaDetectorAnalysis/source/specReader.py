@@ -18,8 +18,8 @@ import numpy as np
 from matplotlib.patches import Rectangle
 import xrayutilities as xu
 import matplotlib.pyplot as plt
-from spec2nexus.spec import SpecDataFile, SpecDataFileHeader
 from detectorDialog import DetectorDialog
+from specIndex import SpecIndex
 
 # ---------------------------------------------------------------------------------------------------------------------#
 
@@ -36,13 +36,14 @@ class ReadSpec():
         """This method loads the spec file and creates the widgets on the control QDockWidget.
         """
         self.chambers = []
-        self.specFile = SpecDataFile(specFile)
-        self.specHeader = SpecDataFileHeader(specFile)
-        self.scans = self.specFile.scans
+        self.specIndex = SpecIndex(specFile)
         self.scan = str(int(os.path.basename(directory)))
+        # Only the scan of the directory is parsed, the index seeks straight to it
+        self.scans = {self.scan: self.specIndex.scan(self.scan)}
+        self.specHeader = self.scans[self.scan].header
         self.specFileOpened = True
 
-        self.maxScans = self.specFile.getMaxScanNumber()
+        self.maxScans = self.specIndex.getMaxScanNumber()
 
         # Gets possible normalizer values
         for key in self.scans[self.scan].data.keys():
@@ -129,9 +130,20 @@ class ReadSpec():
                                                      "they follow the appropriate format.")
 
 
+    def rowCount(self):
+        """Number of data points of the scan in the spec file.
+        """
+        return max([len(column) for column in self.scans[self.scan].data.values()] or [0])
+
     def getSpecData(self, i):
         """Gets the appropriate spec value for the selected image.
+        :param i: spec data row of the image, -1 clears the values for an image without a data point
         """
+        if i < 0:
+            for box in self.specInfoBoxes:
+                box.clear()
+            return
+
         try:
             specValue = []
 
@@ -223,7 +235,7 @@ class ReadSpec():
         angles = self.detectorDialog.getAngles()
         for angle in angles:
             try:
-                angleListInfo.append(self.specFile.scans[self.scan].data[angle])
+                angleListInfo.append(self.scans[self.scan].data[angle])
             except KeyError:
                 try:
                     motorValue = self.motorSpecInfoDic[angle]
@@ -240,19 +252,11 @@ class ReadSpec():
         """
         self.totalScans = 0
         self.motorSpecInfoDic = {}
-        buf = open(specFile, 'r').read()
-        buf.replace('\r\n', '\n').replace('\r', '\n')
-
-        lines = buf.splitlines()
-
-        for line in lines:
-            if line.startswith("#O0"):
-                lineO = line
-                break
+        lineO = self.specIndex.headerLine(self.scan, "#O0")
 
         O = lineO.split()
         O.pop(0)
-        lineP = self.specFile.scans[self.scan].P[0]
+        lineP = self.scans[self.scan].P[0]
         P = lineP.split()
 
         if len(O) != len(P):
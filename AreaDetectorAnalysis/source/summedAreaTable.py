@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+class SummedAreaTable(object):
+    """Integral image of a frame. Built once when the frame is loaded, it gives the sum of any rectangle with four
+    lookups and its row or column profile from one slice, so moving or resizing the ROI costs the same whatever its
+    size. Counts are Poisson distributed, so the variance of a sum is the sum itself.
+    """
+
+    def __init__(self, img, pixelMask=None):
+        """
+        :param img: 2D array
+        :param pixelMask: optional PixelMask, masked pixels count as zero
+        """
+        img = np.asarray(img)
+        self.shape = img.shape
+        self.table = np.zeros((img.shape[0] + 1, img.shape[1] + 1), dtype=np.float64)
+        body = self.table[1:, 1:]
+        if pixelMask is None:
+            np.cumsum(img, 0, dtype=np.float64, out=body)
+        else:
+            body[...] = img
+            body[pixelMask.masked] = 0
+            np.cumsum(body, 0, out=body)
+        np.cumsum(body, 1, out=body)
+
+    def sum(self, y0, y1, x0, x1):
+        """Sum of img[y0:y1, x0:x1], bounds are handled like numpy slices.
+        :return: float
+        """
+        y0, y1 = self._bounds(y0, y1, self.shape[0])
+        x0, x1 = self._bounds(x0, x1, self.shape[1])
+        t = self.table
+        return float(t[y1, x1] - t[y0, x1] - t[y1, x0] + t[y0, x0])
+
+    def profile(self, axis, y0, y1, x0, x1):
+        """Line profile of img[y0:y1, x0:x1], like np.sum(img[y0:y1, x0:x1], axis), from one row or column of
+        differences of the table.
+        :param axis: 0 gives one value per column, 1 one value per row
+        :return: 1D float64 array
+        """
+        y0, y1 = self._bounds(y0, y1, self.shape[0])
+        x0, x1 = self._bounds(x0, x1, self.shape[1])
+        t = self.table
+        if axis == 0:
+            return np.diff(t[y1, x0:x1 + 1] - t[y0, x0:x1 + 1])
+        return np.diff(t[y0:y1 + 1, x1] - t[y0:y1 + 1, x0])
+
+    def sums(self, y0, y1, x0, x1):
+        """Sums of many rectangles at once, bounds are arrays clipped to the image.
+        :return: 1D float64 array, one sum per rectangle
+        """
+        return boxSums(self.table, *clipBoxes(self.shape, y0, y1, x0, x1))
+
+    def size(self, y0, y1, x0, x1):
+        """Number of pixels in img[y0:y1, x0:x1].
+        :return: int
+        """
+        y0, y1 = self._bounds(y0, y1, self.shape[0])
+        x0, x1 = self._bounds(x0, x1, self.shape[1])
+        return (y1 - y0) * (x1 - x0)
+
+    def _bounds(self, start, stop, length):
+        start, stop = slice(start, stop).indices(length)[:2]
+        return start, max(start, stop)
+
+
+def stackTables(frames):
+    """Summed area tables of a stack of frames.
+    :param frames: (N, rows, columns) array
+    :return: (N, rows + 1, columns + 1) float64 array
+    """
+    frames = np.asarray(frames)
+    tables = np.zeros((frames.shape[0], frames.shape[1] + 1, frames.shape[2] + 1), dtype=np.float64)
+    np.cumsum(frames, 1, dtype=np.float64, out=tables[:, 1:, 1:])
+    np.cumsum(tables[:, 1:, 1:], 2, out=tables[:, 1:, 1:])
+    return tables
+
+
+def clipBoxes(shape, y0, y1, x0, x1):
+    """Clips arrays of rectangle bounds to an image of the given shape, empty rectangles stay empty.
+    :return: y0, y1, x0, x1 integer arrays
+    """
+    y0 = np.clip(y0, 0, shape[0])
+    x0 = np.clip(x0, 0, shape[1])
+    return y0, np.maximum(np.clip(y1, 0, shape[0]), y0), x0, np.maximum(np.clip(x1, 0, shape[1]), x0)
+
+
+def boxSums(table, y0, y1, x0, x1):
+    """Sums of rectangles from a table or a stack of tables, four lookups per rectangle.
+    :param table: (..., rows + 1, columns + 1) summed area table(s)
+    :param y0, y1, x0, x1: integer arrays of clipped bounds
+    :return: (..., number of rectangles) float64 array
+    """
+    return table[..., y1, x1] - table[..., y0, x1] - table[..., y1, x0] + table[..., y0, x0]
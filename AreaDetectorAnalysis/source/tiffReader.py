@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import struct
+import numpy as np
+from PIL import Image
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+#  Tag numbers
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+STRIP_OFFSETS = 273
+SAMPLES_PER_PIXEL = 277
+ROWS_PER_STRIP = 278
+STRIP_BYTE_COUNTS = 279
+SAMPLE_FORMAT = 339
+
+#  Byte sizes and struct codes of the tag types we need to read
+TAG_TYPES = {1: (1, 'B'), 3: (2, 'H'), 4: (4, 'I'), 8: (2, 'h'), 9: (4, 'i'), 16: (8, 'Q')}
+
+#  (SampleFormat, BitsPerSample) -> numpy kind
+SAMPLE_KINDS = {(1, 8): 'u1', (1, 16): 'u2', (1, 32): 'u4',
+                (2, 8): 'i1', (2, 16): 'i2', (2, 32): 'i4',
+                (3, 32): 'f4', (3, 64): 'f8'}
+
+
+class TiffLayout(object):
+    """Pixel layout of an uncompressed, single strip block TIFF image."""
+    def __init__(self, shape, dtype, offset):
+        self.shape = shape
+        self.dtype = dtype
+        self.offset = offset
+        self.nbytes = int(np.prod(shape)) * dtype.itemsize
+
+    def __eq__(self, other):
+        return isinstance(other, TiffLayout) and self.shape == other.shape and self.dtype == other.dtype and \
+            self.offset == other.offset
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+def readTiffLayout(fileName):
+    """Parses the first IFD of a TIFF file.
+    :param fileName: path to the TIFF image
+    :return: TiffLayout, or None when the pixels can't be mapped directly (compressed, multi-sample, tiled, ...)
+    """
+    with open(fileName, 'rb') as f:
+        ifd = readIFDBytes(f)
+        if ifd is None:
+            return None
+        return parseIFD(f, ifd)
+
+
+def readIFDBytes(f):
+    """Reads the TIFF header and the raw entries of the first IFD. Images written by the same detector with the
+    same settings have identical bytes here.
+    :param f: file opened in binary mode
+    :return: bytes, or None if this isn't a TIFF file
+    """
+    head = f.read(8)
+    if head[:4] not in (b'II*\x00', b'MM\x00*'):
+        return None
+    endian = _byteOrder(head)
+    f.seek(struct.unpack(endian + 'I', head[4:8])[0])
+    count = f.read(2)
+    if len(count) < 2:
+        return None
+    return head + count + f.read(12 * struct.unpack(endian + 'H', count)[0])
+
+
+def parseIFD(f, ifd):
+    """Decodes the tags needed to locate the pixels.
+    :param f: the file the IFD was read from, used for values stored outside the IFD
+    :param ifd: bytes returned by readIFDBytes
+    :return: TiffLayout or None
+    """
+    endian = _byteOrder(ifd)
+    numTags = (len(ifd) - 10) // 12
+    tags = {}
+    for n in range(numTags):
+        entry = ifd[10 + 12 * n:22 + 12 * n]
+        tag, tagType, count = struct.unpack(endian + 'HHI', entry[:8])
+        if tagType not in TAG_TYPES:
+            continue
+        size, code = TAG_TYPES[tagType]
+        if size * count <= 4:
+            raw = entry[8:8 + size * count]
+        else:
+            f.seek(struct.unpack(endian + 'I', entry[8:12])[0])
+            raw = f.read(size * count)
+        tags[tag] = struct.unpack(endian + code * count, raw)
+
+    try:
+        width = tags[IMAGE_WIDTH][0]
+        height = tags[IMAGE_LENGTH][0]
+        offsets = tags[STRIP_OFFSETS]
+        byteCounts = tags[STRIP_BYTE_COUNTS]
+    except KeyError:
+        return None
+
+    if tags.get(COMPRESSION, (1,))[0] != 1 or tags.get(SAMPLES_PER_PIXEL, (1,))[0] != 1:
+        return None
+
+    kind = SAMPLE_KINDS.get((tags.get(SAMPLE_FORMAT, (1,))[0], tags.get(BITS_PER_SAMPLE, (1,))[0]))
+    if kind is None:
+        return None
+    dtype = np.dtype(endian + kind)
+
+    # Strips have to follow each other so the whole image is one block of bytes
+    for i in range(1, len(offsets)):
+        if offsets[i] != offsets[i - 1] + byteCounts[i - 1]:
+            return None
+
+    layout = TiffLayout((height, width), dtype, offsets[0])
+    if sum(byteCounts) < layout.nbytes:
+        return None
+
+    return layout
+
+
+def _byteOrder(head):
+    return '<' if head[:2] == b'II' else '>'
+
+
+class TiffFrameReader(object):
+    """Reads the images of a scan without going through PIL. The IFD of the first image is parsed once, the other
+    images only have their IFD bytes compared against it, and the pixels are read straight into a numpy array.
+    Images with a different or unsupported layout are opened with PIL instead.
+    """
+
+    def __init__(self, fileList):
+        """
+        :param fileList: list of image paths, kept by reference
+        """
+        self.fileList = fileList
+        self.layout = None
+        self.ifd = None
+        self.native = {}  # path -> True if the image has the scan layout
+
+        if len(fileList) != 0:
+            with open(fileList[0], 'rb') as f:
+                self.ifd = readIFDBytes(f)
+                if self.ifd is not None:
+                    self.layout = parseIFD(f, self.ifd)
+
+    def checkLayout(self):
+        """Checks every image of the scan against the layout of the first one.
+        :return: list with the paths of the images that will be read with PIL
+        """
+        return [path for path in self.fileList if not self.isNative(path)]
+
+    def isNative(self, path):
+        """Whether the image can be read directly.
+        :param path: image path
+        :return: bool
+        """
+        if path not in self.native:
+            if self.layout is None:
+                self.native[path] = False
+            else:
+                with open(path, 'rb') as f:
+                    ifd = readIFDBytes(f)
+                    self.native[path] = ifd == self.ifd or (ifd is not None and parseIFD(f, ifd) == self.layout)
+        return self.native[path]
+
+    def read(self, i, out=None):
+        """Reads image i of the scan.
+        :param i: frame index
+        :param out: optional array to read into, must have the layout's shape and dtype
+        :return: 2D array
+        """
+        return self.readFile(self.fileList[i], out)
+
+    def readFile(self, path, out=None):
+        """Reads one image of the scan by its path, see read.
+        """
+        if not self.isNative(path):
+            return np.array(Image.open(path))
+
+        if out is None:
+            out = np.empty(self.layout.shape, dtype=self.layout.dtype.newbyteorder('='))
+        with open(path, 'rb') as f:
+            f.seek(self.layout.offset)
+            if f.readinto(memoryview(out.reshape(-1).view(np.uint8))) != self.layout.nbytes:
+                raise IOError("Unexpected end of file in " + path)
+        if not self.layout.dtype.isnative:
+            out.byteswap(True)
+        return out
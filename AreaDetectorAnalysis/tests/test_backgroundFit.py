@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+import pytest
+from scipy import interpolate
+import backgroundFit
+from areaData import AreaData, backgroundPixels, outsidePeak
+from backgroundFit import PolynomialBackground, PolynomialSurface
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+DROI = (45, 30, 80, 50)
+PROI = (40, 31, 8, 6)
+BROI = (41, 30, 24, 20)
+
+
+def makeFrame(seed=0):
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[:60, :90]
+    return rng.poisson(20.0 + 0.1 * x + 0.05 * y + 200.0 * np.exp(-((x - 40) ** 2 + (y - 31) ** 2) / 6.0))
+
+
+@pytest.fixture
+def emptyKnotCache(monkeypatch):
+    """Knots chosen by other tests for the same roi would otherwise be reused."""
+    monkeypatch.setattr(backgroundFit, '_splineKnots', {})
+
+
+def testPolynomialBackgroundMatchesPolyfit():
+    rng = np.random.RandomState(0)
+    xb = np.arange(100, 131)
+    keep = outsidePeak(xb, np.arange(110, 121))
+    profiles = rng.poisson(50.0, (4, len(xb))).astype(np.float64)
+    for deg in (0, 1, 2, 3):
+        fitted, stderr = PolynomialBackground(xb, keep, deg).fit(profiles)
+        for profile, line, err in zip(profiles, fitted, stderr):
+            coefficients = np.polyfit(xb[keep], profile[keep], deg)
+            np.testing.assert_allclose(line, np.polyval(coefficients, xb), rtol=1e-8)
+            residuals = profile[keep] - np.polyval(coefficients, xb[keep])
+            np.testing.assert_allclose(err, np.sqrt(np.mean(residuals ** 2)), rtol=1e-8)
+
+
+def testPolynomialSurfaceMatchesLeastSquares():
+    back = makeFrame()[20:41, 29:54].astype(np.float64)
+    keep = backgroundPixels(PROI, BROI)
+    surface = PolynomialSurface(np.arange(29, 54), np.arange(20, 41), keep, 2).fit(back)
+    x, y = np.meshgrid(np.arange(29, 54, dtype=np.float64), np.arange(20, 41, dtype=np.float64))
+    design = np.column_stack([x.ravel() ** i * y.ravel() ** j for i in range(3) for j in range(3 - i)])
+    coefficients = np.linalg.lstsq(design[keep.ravel()], back[keep], rcond=None)[0]
+    np.testing.assert_allclose(surface, np.dot(design, coefficients).reshape(back.shape), rtol=1e-8)
+
+
+def testReusedKnotsRefitTheKnotsOfTheFirstFrame(emptyKnotCache):
+    first = AreaData(makeFrame(), DROI, PROI, BROI)
+    xb = np.arange(first.bx_ndx[0], first.bx_ndx[1])
+    yb = np.arange(first.by_ndx[0], first.by_ndx[1])
+    xg, yg = np.meshgrid(xb, yb, indexing='ij')
+    in_peak = ((xg >= first.px_ndx[0]) & (xg < first.px_ndx[1]) &
+               (yg >= first.py_ndx[0]) & (yg < first.py_ndx[1]))
+    z = first.back_img.T[~in_peak]
+    w = 1. / np.sqrt(np.maximum(z, 1))
+    tck = interpolate.bisplrep(xg[~in_peak], yg[~in_peak], z, w=w, kx=3, ky=3, s=None)
+    refit = interpolate.bisplrep(xg[~in_peak], yg[~in_peak], z, w=w, kx=3, ky=3, task=-1, tx=tck[0], ty=tck[1])
+
+    reused = first.Integral2d(3, 3, reuseKnots=True)
+    np.testing.assert_allclose(reused[2], interpolate.bisplev(xb, yb, refit).T, rtol=1e-8)
+    np.testing.assert_allclose(reused[4], first.Integral2d(3, 3)[4], rtol=0.02)
+
+    # later frames keep the first knots and still fit their own background
+    other = AreaData(makeFrame(1), DROI, PROI, BROI)
+    np.testing.assert_allclose(other.Integral2d(3, 3, reuseKnots=True)[4], other.Integral2d(3, 3)[4], rtol=0.05)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from areaData import AreaData
+from batchIntegration import frameGroups, integrateStack, integrateStackSurface
+from pixelMask import PixelMask
+from roiTracker import trackRois
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+DROI = (60, 40, 110, 70)
+
+
+def makeFrames(count=6, shape=(80, 120), seed=0):
+    """Poisson frames with a peak drifting by one pixel per frame over a sloped background."""
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[:shape[0], :shape[1]]
+    frames = []
+    for i in range(count):
+        peak = 400.0 * np.exp(-((x - 55 - i) ** 2 + (y - 38) ** 2) / 8.0)
+        frames.append(rng.poisson(5.0 + 0.02 * x + peak).astype(np.int32))
+    return np.array(frames)
+
+
+def frameIntegrals(img, proi, broi, deg0=1, deg1=1, pixelMask=None):
+    data = AreaData(img, DROI, proi, broi, pixelMask=pixelMask)
+    return (data.areaIntegral() + data.lineIntegral(0, deg0)[4:] + data.lineIntegral(1, deg1)[4:])
+
+
+def checkStack(integrals, expected):
+    for row, values in zip(integrals, expected):
+        np.testing.assert_allclose(tuple(row), values, rtol=1e-10)
+
+
+def testIntegrateStackMatchesAreaData():
+    frames = makeFrames()
+    proi, broi = (56, 38, 8, 10), (56, 38, 30, 28)
+    integrals = integrateStack(frames, proi, broi, 1, 2, chunkSize=4)
+    checkStack(integrals, [frameIntegrals(img, proi, broi, 1, 2) for img in frames])
+
+
+def testOddWidthRoiKeepsAreaDataBox():
+    frames = makeFrames()
+    proi, broi = (57, 37, 5, 7), (57, 37, 25, 21)
+    assert frameGroups(proi, broi, len(frames))[0][1:3] == (proi, broi)
+    integrals = integrateStack(frames, proi, broi)
+    checkStack(integrals, [frameIntegrals(img, proi, broi) for img in frames])
+
+
+def testTrackedRoisStayOnTheRoiGrid():
+    frames = makeFrames()
+    proi, broi = (55, 38, 5, 7), (55, 38, 25, 21)
+    peakRois, backRois, moments = trackRois(frames, proi, broi)
+    assert peakRois.dtype.kind == 'i' and backRois.dtype.kind == 'i'
+    assert np.all(np.diff(peakRois[:, 0]) >= 0) and peakRois[-1, 0] > proi[0]
+    integrals = integrateStack(frames, peakRois, backRois)
+    checkStack(integrals, [frameIntegrals(img, tuple(p), tuple(b)) for img, p, b in zip(frames, peakRois, backRois)])
+
+
+def testMaskedIntegrateStackMatchesAreaData():
+    frames = makeFrames()
+    pixelMask = PixelMask(frames.shape[1:])
+    pixelMask.masked[30:32, :] = True  # a module gap across the background area
+    pixelMask.addRectangle((62, 45, 3, 3))
+    proi, broi = (56, 38, 8, 10), (56, 38, 30, 28)
+    integrals = integrateStack(frames, proi, broi, 2, 1, pixelMask=pixelMask)
+    checkStack(integrals, [frameIntegrals(img, proi, broi, 2, 1, pixelMask) for img in frames])
+
+
+def testIntegrateStackSurfaceMatchesAreaData():
+    frames = makeFrames()
+    pixelMask = PixelMask(frames.shape[1:])
+    pixelMask.addRectangle((45, 30, 3, 3))
+    proi, broi = (56, 38, 8, 10), (56, 38, 30, 28)
+    integrals = integrateStackSurface(frames, proi, broi, 2, chunkSize=4, pixelMask=pixelMask)
+    for row, img in zip(integrals, frames):
+        expected = AreaData(img, DROI, proi, broi, pixelMask=pixelMask).Integral2dPolynomial(2)[4:]
+        np.testing.assert_allclose(tuple(row), expected, rtol=1e-10)
+
+
+def testTrackedSurfaceIntegralsMatchAreaData():
+    frames = makeFrames()
+    pixelMask = PixelMask(frames.shape[1:])
+    pixelMask.addRectangle((62, 45, 3, 3))
+    peakRois, backRois, moments = trackRois(frames, (55, 38, 5, 7), (55, 38, 25, 21))
+    integrals = integrateStackSurface(frames, peakRois, backRois, 2, chunkSize=4, pixelMask=pixelMask)
+    for row, img, p, b in zip(integrals, frames, peakRois, backRois):
+        expected = AreaData(img, DROI, tuple(p), tuple(b), pixelMask=pixelMask).Integral2dPolynomial(2)[4:]
+        np.testing.assert_allclose(tuple(row), expected, rtol=1e-9)
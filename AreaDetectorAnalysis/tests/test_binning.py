@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+import pytest
+from areaData import roiIndices
+from binning import Binning
+from pixelMask import PixelMask
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+SHAPE = (195, 487)
+
+
+def makeFrames(count=3, seed=0):
+    return np.random.RandomState(seed).poisson(10.0, (count,) + SHAPE).astype(np.int32)
+
+
+def randomRois(count=300, seed=1):
+    """Rois with integer and half pixel centers and widths, inside the binned part of the image."""
+    rng = np.random.RandomState(seed)
+    xw = rng.randint(1, 60, count) / 2.0 * 2 ** rng.randint(0, 2, count)
+    yw = rng.randint(1, 40, count) / 2.0 * 2 ** rng.randint(0, 2, count)
+    xc = rng.randint(70, 800, count) / 2.0
+    yc = rng.randint(50, 300, count) / 2.0
+    return list(zip(xc, yc, xw, yw))
+
+
+def testBinnedFramesAreBlockSums():
+    frames = makeFrames()
+    binning = Binning(4, 3)
+    binned = binning.apply(frames[0])
+    assert binned.shape == binning.shape(SHAPE) == (65, 121) and binned.dtype == np.int64
+    for r, c in [(0, 0), (10, 50), (64, 120)]:
+        assert binned[r, c] == frames[0][3 * r:3 * r + 3, 4 * c:4 * c + 4].sum()
+    np.testing.assert_array_equal(binning.applyStack(frames, chunkSize=2), binning.apply(frames))
+    img = frames[0]
+    assert Binning().isIdentity and Binning().apply(img) is img
+    with pytest.raises(ValueError):
+        Binning(0, 2)
+
+
+def testBinnedMaskCoversMaskedPixels():
+    pixelMask = PixelMask(SHAPE)
+    pixelMask.masked[97:101, 274:276] = True
+    binned = Binning(4, 4).mask(pixelMask)
+    np.testing.assert_array_equal(np.argwhere(binned.masked), [[24, 68], [25, 68]])
+
+
+@pytest.mark.parametrize('columns, rows', [(1, 1), (2, 2), (4, 3), (5, 7)])
+def testRoiRoundTrip(columns, rows):
+    binning = Binning(columns, rows)
+    for roi in randomRois():
+        x, y = roiIndices(roi)
+        binnedRoi = binning.roi(roi)
+        bx, by = roiIndices(binnedRoi)
+        # the blocks of the binned roi are exactly those holding the pixels of the roi
+        assert bx == [x[0] // columns, (x[1] - 1) // columns + 1]
+        assert by == [y[0] // rows, (y[1] - 1) // rows + 1]
+        # going back gives the pixels of those blocks, and binning that again gives the same blocks
+        ux, uy = roiIndices(binning.unbinRoi(binnedRoi))
+        assert ux == [bx[0] * columns, bx[1] * columns] and uy == [by[0] * rows, by[1] * rows]
+        assert roiIndices(binning.roi(binning.unbinRoi(binnedRoi))) == (bx, by)
+
+
+def testBinnedRoiSumsMatchUnbinnedBlocks():
+    img = makeFrames(1)[0]
+    binning = Binning(4, 3)
+    binned = binning.apply(img)
+    for roi in randomRois(50):
+        bx, by = roiIndices(binning.roi(roi))
+        ux, uy = roiIndices(binning.unbinRoi(binning.roi(roi)))
+        assert binned[by[0]:by[1], bx[0]:bx[1]].sum() == img[uy[0]:uy[1], ux[0]:ux[1]].sum()
+
+
+def testPixelPositionsAreBlockCenters():
+    binning = Binning(4, 3)
+    np.testing.assert_array_equal(binning.pixelPositions(np.arange(3), 0), [1.5, 5.5, 9.5])
+    np.testing.assert_array_equal(binning.pixelPositions(np.arange(3), 1), [1, 4, 7])
+    np.testing.assert_array_equal(Binning().pixelPositions(np.arange(5, 8), 0), [5, 6, 7])
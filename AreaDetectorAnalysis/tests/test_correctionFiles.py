@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import numpy as np
+import correctionFiles
+from correctionFiles import loadBadPixels, loadSidecar, sidecarPath
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+def writeBadPixels(path):
+    with open(path, 'w') as f:
+        f.write("10 20 11 20\n30 40 30 41\n")
+
+
+def testSidecarIsWrittenOnceAndReused(tmpdir):
+    path = str(tmpdir.join('bad.txt'))
+    writeBadPixels(path)
+    calls = []
+
+    def parse(p):
+        calls.append(p)
+        return correctionFiles.parseBadPixels(p)
+
+    first = loadSidecar(path, parse)
+    second = loadSidecar(path, parse)
+    assert len(calls) == 1 and os.path.isfile(sidecarPath(path))
+    np.testing.assert_array_equal(first, second)
+    bad, replacing = loadBadPixels(path)
+    np.testing.assert_array_equal(bad, [[10, 20], [30, 40]])
+    np.testing.assert_array_equal(replacing, [[11, 20], [30, 41]])
+
+
+def testSidecarRemovedByAnotherProcess(tmpdir, monkeypatch):
+    path = str(tmpdir.join('bad.txt'))
+    writeBadPixels(path)
+    rename = os.rename
+
+    def renameThenRemove(src, dst):
+        rename(src, dst)
+        os.remove(dst)  # another process cleaned the sidecars up in between
+
+    monkeypatch.setattr(correctionFiles.os, 'rename', renameThenRemove)
+    np.testing.assert_array_equal(loadSidecar(path, correctionFiles.parseBadPixels),
+                                  correctionFiles.parseBadPixels(path))
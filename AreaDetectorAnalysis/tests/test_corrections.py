@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from corrections import FrameCorrections
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+SHAPE = (40, 60)
+
+
+def makeFrames(count=10, seed=0):
+    frames = np.random.RandomState(seed).poisson(50.0, (count,) + SHAPE).astype(np.int32)
+    frames[:, 20, :] = -2  # module gap
+    return frames
+
+
+def correctOneByOne(img, badPixels, replacingPixels, efficiency=None):
+    """The corrections as the bad pixel file describes them, one pixel after the other."""
+    img = img.astype(np.float64) if efficiency is not None else img.copy()
+    if efficiency is not None:
+        img /= efficiency
+    for (bx, by), (rx, ry) in zip(badPixels, replacingPixels):
+        img[by, bx] = img[ry, rx]
+    return img
+
+
+def testCompiledCorrectionsMatchOneByOne():
+    frames = makeFrames()
+    efficiency = np.random.RandomState(1).uniform(0.8, 1.2, SHAPE)
+    # (3, 4) is replaced by (5, 4), which was replaced before it, and (9, 9) replaced twice
+    badPixels = [(5, 4), (3, 4), (9, 9), (9, 9), (50, 30)]
+    replacingPixels = [(6, 4), (5, 4), (10, 9), (8, 9), (51, 30)]
+    for gain in (None, efficiency):
+        corrections = FrameCorrections(SHAPE, badPixels, replacingPixels, gain)
+        assert len(corrections) == 4
+        expected = [correctOneByOne(img, badPixels, replacingPixels, gain) for img in frames]
+        np.testing.assert_allclose(corrections.apply(frames[0]), expected[0], rtol=1e-12)
+        np.testing.assert_allclose(corrections.apply(frames), expected, rtol=1e-12)
+
+
+def testInPlaceCorrection():
+    frames = makeFrames().astype(np.float64)
+    expected = correctOneByOne(frames[2], [(1, 1)], [(2, 1)])
+    corrections = FrameCorrections(SHAPE, [(1, 1)], [(2, 1)])
+    img = frames[2].copy()
+    assert corrections.apply(img, out=img) is img
+    np.testing.assert_array_equal(img, expected)
+
+
+def testPixelsWithoutEfficiencyAreMasked():
+    frames = makeFrames()
+    efficiency = np.ones(SHAPE)
+    efficiency[3, 4] = 0
+    efficiency[5, 6] = np.nan
+    efficiency[7, 8] = -1
+    corrections = FrameCorrections(SHAPE, efficiency=efficiency)
+    corrected = corrections.apply(frames)
+    assert np.all(np.isfinite(corrected))
+    assert np.all(corrected[:, [3, 5, 7], [4, 6, 8]] == 0)
+    np.testing.assert_array_equal(np.argwhere(corrections.masked), [[3, 4], [5, 6], [7, 8]])
+    np.testing.assert_array_equal(corrected[:, ~corrections.masked], frames[:, ~corrections.masked])
+    assert FrameCorrections(SHAPE, efficiency=np.ones(SHAPE)).masked is None
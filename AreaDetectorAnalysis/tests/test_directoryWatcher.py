@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import directoryWatcher
+from directoryWatcher import DirectoryWatcher
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+def writeImage(tmpdir, name, size=100):
+    path = tmpdir.join(name)
+    path.write_binary(b'\0' * size)
+    return str(path)
+
+
+def testImagesAreReportedOnceTheirSizeSettles(tmpdir):
+    known = writeImage(tmpdir, 'scan_00001.tif')
+    watcher = DirectoryWatcher(str(tmpdir), [known])
+    path = writeImage(tmpdir, 'scan_00002.tif', 40)
+    assert watcher.poll() == []
+    writeImage(tmpdir, 'scan_00002.tif', 100)
+    assert watcher.poll() == []
+    assert watcher.poll() == [path]
+    assert watcher.poll() == []
+
+
+def testImagesWaitForTheExpectedSize(tmpdir):
+    watcher = DirectoryWatcher(str(tmpdir), expectedSize=100)
+    path = writeImage(tmpdir, 'scan_00001.tif', 60)
+    assert watcher.poll() == []
+    assert watcher.poll() == []  # settled but short, the detector is still writing
+    writeImage(tmpdir, 'scan_00001.tif', 100)
+    assert watcher.poll() == []
+    assert watcher.poll() == [path]
+
+
+def testOnlyNewImagesInNaturalOrder(tmpdir):
+    watcher = DirectoryWatcher(str(tmpdir))
+    paths = [writeImage(tmpdir, name) for name in ('scan_10.tif', 'scan_9.TIFF', 'scan_100.tif')]
+    tmpdir.join('notes.txt').write('')
+    tmpdir.mkdir('raw')
+    assert watcher.poll() == []
+    assert watcher.poll() == [paths[1], paths[0], paths[2]]
+
+
+def testOneDirectoryScanPerPoll(tmpdir, monkeypatch):
+    scans = []
+
+    def countingScandir(path):
+        scans.append(path)
+        return os.scandir(path)
+
+    monkeypatch.setattr(directoryWatcher, 'scandir', countingScandir)
+    for i in range(5):
+        writeImage(tmpdir, 'scan_%05d.tif' % i)
+    watcher = DirectoryWatcher(str(tmpdir))
+    watcher.poll()
+    assert len(watcher.poll()) == 5
+    assert scans == [str(tmpdir)] * 2
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import numpy as np
+import pytest
+from frameCache import FrameCache
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+def makeFrame(value=0):
+    return np.full((10, 10), value, dtype=np.int32)  # 400 bytes
+
+
+def testLeastRecentlyUsedFrameIsEvicted():
+    cache = FrameCache(maxBytes=1200)
+    for name in 'abc':
+        cache.put((name, 0, None), makeFrame())
+    assert cache.get(('a', 0, None)) is not None
+    cache.put(('d', 0, None), makeFrame())
+    assert ('b', 0, None) not in cache
+    assert [key[0] for key in cache.frames] == ['c', 'a', 'd']
+
+
+def testFramesStayWithinTheBudget():
+    cache = FrameCache(maxBytes=1000)
+    for i in range(5):
+        frame = cache.put(('f%d' % i, 0, None), makeFrame(i))
+        assert not frame.flags.writeable
+        assert cache.nbytes <= 1000
+    assert len(cache) == 2 and cache.nbytes == 800
+
+    cache.put(('f4', 0, None), np.zeros((5, 10), dtype=np.int32))
+    assert len(cache) == 2 and cache.nbytes == 600
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def testShrinkingTheBudgetEvicts():
+    cache = FrameCache(maxBytes=2000)
+    for i in range(4):
+        cache.put(('f%d' % i, 0, None), makeFrame(i))
+    cache.setBudget(900)
+    assert [key[0] for key in cache.frames] == ['f2', 'f3'] and cache.nbytes == 800
+    cache.setBudget(0)
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def testOversizeFrameIsNotCached():
+    cache = FrameCache(maxBytes=1000)
+    cache.put(('small', 0, None), makeFrame())
+    big = np.zeros((100, 100), dtype=np.int32)
+    assert cache.put(('big', 0, None), big) is big
+    assert ('big', 0, None) not in cache and ('small', 0, None) in cache
+    assert cache.nbytes == 400
+
+
+def testKeysChangeWithMtimeAndCorrections(tmpdir):
+    path = str(tmpdir.join('image_00001.tif'))
+    tmpdir.join('image_00001.tif').write('')
+    cache = FrameCache()
+    cache.put(cache.key(path), makeFrame(1))
+    cache.put(cache.key(path, (True, False, (1, 1), 0)), makeFrame(2))
+    assert cache.get(cache.key(path))[0, 0] == 1
+    assert cache.get(cache.key(path, (True, False, (1, 1), 0)))[0, 0] == 2
+    assert cache.get(cache.key(path, (True, True, (1, 1), 0))) is None
+    assert cache.get(cache.key(path, (True, False, (1, 1), 1))) is None
+
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+    assert cache.get(cache.key(path)) is None
+    assert cache.get(cache.key(path, mtime=st.st_mtime))[0, 0] == 1
+    with pytest.raises(OSError):
+        cache.key(str(tmpdir.join('missing.tif')))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import threading
+import numpy as np
+import pytest
+from frameCache import FrameCache
+from framePrefetcher import FramePrefetcher
+from scanCube import FrameStack
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+class FakeStack(FrameStack):
+    """Frames filled with their index, reads are recorded with the thread that made them."""
+
+    def __init__(self, count=20):
+        self.fileList = ['frame_%05d.tif' % i for i in range(count)]
+        self.dtype = np.dtype(np.int32)
+        self.frameShape = (4, 5)
+        self.reader = self
+        self.reads = []
+
+    def frame(self, i):
+        return self.read(i)
+
+    def read(self, i, out=None):
+        return self.readFile(self.fileList[i], out)
+
+    def readFile(self, path, out=None):
+        self.reads.append((path, threading.current_thread().name))
+        if path.endswith('_00013.tif'):
+            raise IOError("truncated " + path)
+        return np.full(self.frameShape, self.fileList.index(path), dtype=self.dtype)
+
+    def mtime(self, path):
+        return 0.0
+
+
+@pytest.fixture
+def prefetcher():
+    stack = FakeStack()
+    prefetcher = FramePrefetcher(stack, ahead=3, behind=1, cache=FrameCache())
+    yield prefetcher
+    prefetcher.close()
+
+
+def testNeighboursAreReadInThePool(prefetcher):
+    prefetcher.prefetch(5)
+    assert sorted(prefetcher.pending) == ['frame_%05d.tif' % i for i in (4, 6, 7, 8)]
+    for i in (4, 6, 7, 8):
+        assert prefetcher.get(i)[0, 0] == i
+    reads = prefetcher.scanCube.reads
+    assert sorted(path for path, thread in reads) == ['frame_%05d.tif' % i for i in (4, 6, 7, 8)]
+    assert all(thread != threading.current_thread().name for path, thread in reads)
+
+    # hits are served once, the current frame and frames outside the window are misses
+    assert prefetcher.get(6) is None
+    assert prefetcher.get(5) is None and prefetcher.get(12) is None
+    assert ('frame_00006.tif', 0.0, None) in prefetcher.cache
+
+
+def testWindowMovesAndStaleReadsAreDropped(prefetcher):
+    prefetcher.prefetch(0)
+    assert sorted(prefetcher.pending) == ['frame_%05d.tif' % i for i in (1, 2, 3)]
+    prefetcher.prefetch(10)
+    assert sorted(prefetcher.pending) == ['frame_%05d.tif' % i for i in (9, 11, 12, 13)]
+    assert prefetcher.get(1) is None
+
+    # frames already cached are not read again, failed reads are misses
+    assert prefetcher.get(11)[0, 0] == 11
+    prefetcher.prefetch(12)
+    assert 'frame_00011.tif' not in prefetcher.pending
+    assert prefetcher.get(13) is None
+    prefetcher.prefetch(19)
+    assert sorted(prefetcher.pending) == ['frame_00018.tif']
+
+
+def testCloseForgetsPendingReads(prefetcher):
+    prefetcher.prefetch(5)
+    prefetcher.close()
+    assert prefetcher.pending == {}
+    assert prefetcher.get(6) is None
+    with pytest.raises(ValueError):
+        prefetcher.prefetch(6)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from hotPixels import HotPixelDetector
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+SHAPE = (40, 60)
+
+
+def makeFrames(count=10, seed=0):
+    frames = np.random.RandomState(seed).poisson(50.0, (count,) + SHAPE).astype(np.int32)
+    frames[:, 20, :] = -2  # module gap
+    return frames
+
+
+def testHotAndSaturatedPixelsAreFound():
+    frames = makeFrames()
+    frames[:, 5, 7] += 500  # hot in every frame
+    frames[3:, 30, 40] += 500  # hot in some frames only, a real signal
+    frames[:, 12, 50] = 1048575  # saturated
+    detector = HotPixelDetector.fromFrames(frames, saturation=1048575, chunkSize=3)
+    np.testing.assert_array_equal(np.argwhere(detector.badPixels()), [[5, 7], [12, 50]])
+
+    bad, replacing = detector.replacements()
+    np.testing.assert_array_equal(bad, [[7, 5], [50, 12]])
+    assert np.all(np.abs(replacing - bad).max(1) == 1)
+    corrected = detector.corrections().apply(frames)
+    assert corrected[:, 5, 7].max() < 200 and corrected[:, 12, 50].max() < 200
+    assert np.all(corrected[:, 20, :] == -2)  # gaps are neither bad nor used as replacements
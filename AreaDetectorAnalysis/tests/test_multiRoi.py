@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from areaData import AreaData
+from multiRoi import MultiRoi
+from pixelMask import PixelMask
+from runningBackground import RunningBackground, SubtractedFrames
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+def makeFrame(shape=(60, 90), seed=0):
+    return np.random.RandomState(seed).poisson(30.0, shape).astype(np.int32)
+
+
+def testMultiRoiMatchesAreaData():
+    frames = np.array([makeFrame(seed=i) for i in range(3)])
+    rois = [('a', (20, 20, 6, 6), (20, 20, 16, 14)), ('b', (60, 35, 5, 9), (61, 36, 21, 25))]
+    multi = MultiRoi(rois)
+    stack = multi.integrateStack(frames, chunkSize=2)
+    for i, img in enumerate(frames):
+        single = multi.integrate(img)
+        for j, (name, proi, broi) in enumerate(rois):
+            expected = AreaData(img, (45, 30, 80, 50), proi, broi).areaIntegral()
+            assert single['name'][j] == name
+            np.testing.assert_allclose((single['I'][j], single['sigI'][j]), expected, rtol=1e-12)
+            np.testing.assert_allclose((stack['I'][i, j], stack['sigI'][i, j]), expected, rtol=1e-12)
+
+
+def testMaskedSubtractedMultiRoiMatchesAreaData():
+    frames = np.array([makeFrame(seed=i) for i in range(4)])
+    background = RunningBackground.fromFrames(frames)
+    subtracted = SubtractedFrames(frames, background)
+    pixelMask = PixelMask(frames.shape[1:])
+    pixelMask.masked[30, :] = True
+    pixelMask.addRectangle((21, 19, 2, 2))
+    rois = [('a', (20, 20, 6, 6), (20, 20, 16, 14)), ('b', (60, 35, 5, 9), (61, 36, 21, 25))]
+    multi = MultiRoi(rois)
+    stack = multi.integrateStack(subtracted, chunkSize=3, pixelMask=pixelMask, background=background)
+    for i in range(len(frames)):
+        variance = background.errorVariance(subtracted[i])
+        single = multi.integrate(subtracted[i], pixelMask=pixelMask, variance=variance)
+        for j, (name, proi, broi) in enumerate(rois):
+            expected = AreaData(subtracted[i], (45, 30, 80, 50), proi, broi, pixelMask=pixelMask,
+                                variance=variance).areaIntegral()
+            np.testing.assert_allclose((single['I'][j], single['sigI'][j]), expected, rtol=1e-10)
+            np.testing.assert_allclose((stack['I'][i, j], stack['sigI'][i, j]), expected, rtol=1e-10)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+import pytest
+import pixelMask
+from pixelMask import PixelMask, detectorMask
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+@pytest.fixture
+def emptyMaskCaches(monkeypatch):
+    monkeypatch.setattr(pixelMask, '_detectorMasks', {})
+    monkeypatch.setattr(pixelMask, '_imageMasks', {})
+
+
+def makeFrame(gap=10):
+    frame = np.ones((20, 30), dtype=np.int32)
+    frame[gap, :] = -1
+    return frame
+
+
+def testImagesSeenBeforeAreNotRead(emptyMaskCaches):
+    reads = []
+
+    def readFrame():
+        reads.append(1)
+        return makeFrame()
+
+    first = detectorMask(readFrame, ('image_00001.tif', 1.0))
+    assert np.array_equal(first.masked, makeFrame() < 0)
+    assert detectorMask(readFrame, ('image_00001.tif', 1.0)) is first
+    assert len(reads) == 1
+
+    # a rewritten image is read again, frames with the same gaps share one mask
+    assert detectorMask(readFrame, ('image_00001.tif', 2.0)) is first
+    assert detectorMask(makeFrame(), ('image_00002.tif', 1.0)) is first
+    assert len(reads) == 2
+    assert detectorMask(makeFrame(gap=3)) is not first
+
+
+def testShapesAreAddedToACopy(emptyMaskCaches):
+    shared = detectorMask(makeFrame())
+    mask = shared.copy()
+    mask.addRectangle((5, 4, 2, 2))
+    mask.addPolygon([(20, 2), (26, 2), (26, 6)])
+    assert len(shared) == 30
+    assert mask.masked[3:6, 4:7].all() and mask.masked[4, 25] and not mask.masked[5, 21]
+    assert len(mask) == len(PixelMask.fromPacked(mask.shape, mask.packed()))
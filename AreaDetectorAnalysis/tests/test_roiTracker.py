@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from roiTracker import peakMoments, trackRois
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+def makeFrames(centers, shape=(60, 160), background=50.0):
+    """Noise free peaks on a flat background, one frame per (x, y) center."""
+    y, x = np.mgrid[:shape[0], :shape[1]]
+    return np.array([background + 500.0 * np.exp(-((x - xc) ** 2 + (y - yc) ** 2) / 6.0) for xc, yc in centers])
+
+
+def testBackgroundDoesNotPullTheCentroid():
+    frames = makeFrames([(36.3, 28.6), (30.0, 30.0)])
+    moments = peakMoments(frames, (30, 30, 31, 25))
+    np.testing.assert_allclose(moments['x'], [36.3, 30.0], atol=0.05)
+    np.testing.assert_allclose(moments['y'], [28.6, 30.0], atol=0.05)
+    np.testing.assert_allclose(moments['xx'], 3.0, rtol=0.05)
+    np.testing.assert_allclose(moments['xy'], 0.0, atol=0.05)
+
+
+def testGapsAndEmptyFrames():
+    frames = makeFrames([(30.0, 30.0)] * 2)
+    frames[0, :, 25] = -1
+    frames[1] = 50.0
+    moments = peakMoments(frames, (30, 30, 31, 25))
+    np.testing.assert_allclose((moments['x'][0], moments['y'][0]), (30.0, 30.0), atol=0.2)
+    assert moments['total'][1] == 0 and np.isnan(moments['x'][1])
+
+
+def testWindowFollowsThePeakOutOfItsStart():
+    centers = [(30.0 + 6 * i, 30.0) for i in range(12)] + [(0.0, -100.0)]  # the last frame has no peak
+    frames = makeFrames(centers)
+    proi, broi = (30, 30, 6, 6), (30, 30, 20, 20)
+    peakRois, backRois, moments = trackRois(frames, proi, broi)
+    np.testing.assert_allclose(moments['x'][:-1], [c[0] for c in centers[:-1]], atol=0.05)
+    assert np.isnan(moments['x'][-1])
+    np.testing.assert_array_equal(peakRois[:, 0], [30 + 6 * i for i in range(12)] + [96])
+    np.testing.assert_array_equal(backRois[:, 0] - peakRois[:, 0], 0)
+    assert np.all(peakRois[:, 1] == 30)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+import pytest
+from areaData import AreaData
+from batchIntegration import integrateStack
+from pixelMask import PixelMask
+from runningBackground import RunningBackground, SubtractedFrames
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+def makeFrames(count=20, shape=(40, 50), seed=0):
+    rng = np.random.RandomState(seed)
+    return rng.poisson(20.0, (count,) + shape).astype(np.int32)
+
+
+def testMeanMatchesNumpy():
+    frames = makeFrames()
+    background = RunningBackground.fromFrames(frames, chunkSize=7)
+    np.testing.assert_allclose(background.mean, frames.mean(0), rtol=1e-12)
+    np.testing.assert_allclose(background.variance, frames.var(0, ddof=1), rtol=1e-10)
+
+
+def testSubtractionKeepsNegativeResiduals():
+    frames = makeFrames()
+    background = RunningBackground.fromFrames(frames)
+    subtracted = SubtractedFrames(frames, background)
+    residuals = np.array([subtracted[i] for i in range(len(subtracted))])
+    assert residuals.min() < 0
+    np.testing.assert_allclose(residuals.mean(0), 0, atol=1e-10)
+    np.testing.assert_allclose(background.errorVariance(residuals[3]),
+                               frames[3] + background.variance / len(frames), rtol=1e-10)
+
+
+@pytest.mark.parametrize('masked', [False, True])
+def testSubtractedIntegralsMatchAreaData(masked):
+    frames = makeFrames()
+    background = RunningBackground.fromFrames(frames)
+    subtracted = SubtractedFrames(frames, background)
+    pixelMask = None
+    if masked:
+        pixelMask = PixelMask(frames.shape[1:])
+        pixelMask.masked[14:16, :] = True
+        pixelMask.addRectangle((26, 21, 2, 2))
+    proi, broi = (25, 20, 6, 6), (25, 20, 20, 16)
+    integrals = integrateStack(subtracted, proi, broi, chunkSize=8, pixelMask=pixelMask, background=background)
+    for i in (0, 3, 19):
+        areadata = AreaData(subtracted[i], (25, 20, 40, 30), proi, broi, pixelMask=pixelMask,
+                            variance=background.errorVariance(subtracted[i]))
+        I, sigI = areadata.areaIntegral()
+        np.testing.assert_allclose((integrals['I2d'][i], integrals['sigI2d'][i]), (I, sigI), rtol=1e-10)
+        np.testing.assert_allclose((integrals['I1d0'][i], integrals['sigI1d0'][i]),
+                                   areadata.lineIntegral(0, 1)[4:], rtol=1e-10)
+        np.testing.assert_allclose((integrals['I1d1'][i], integrals['sigI1d1'][i]),
+                                   areadata.lineIntegral(1, 1)[4:], rtol=1e-10)
+
+    # the errors of the raw counts plus those of the background estimate
+    counted = integrateStack(frames, proi, broi, pixelMask=pixelMask)
+    assert np.all(integrals['sigI2d'] > counted['sigI2d'])
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from scanCube import FrameStack, ScanCube
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                          'Sample Data', 'Scan 64', '064')
+
+
+def testFrameStackIsAbstract():
+    with pytest.raises(TypeError):
+        FrameStack()
+
+
+@pytest.mark.skipif(not os.path.isdir(SAMPLE_DIR), reason="sample scan not available")
+def testScanCubeMatchesDecodedImages():
+    cube = ScanCube.fromDirectory(SAMPLE_DIR)
+    assert cube.shape == (201, 195, 487)
+    for i in (0, 100, 200):
+        expected = np.array(Image.open(cube.fileList[i]))
+        np.testing.assert_array_equal(cube[i], expected)
+        np.testing.assert_array_equal(cube.read(i), expected)
+    np.testing.assert_array_equal(cube[10:13, 50:60, 100:120],
+                                  [np.array(Image.open(cube.fileList[i]))[50:60, 100:120] for i in range(10, 13)])
+
+
+@pytest.mark.skipif(not os.path.isdir(SAMPLE_DIR), reason="sample scan not available")
+def testScanContainerMatchesScanCube(tmpdir):
+    pytest.importorskip('h5py')
+    from scanContainer import ScanContainer, convertScan
+    cube = ScanCube.fromDirectory(SAMPLE_DIR)
+    containerFile = str(tmpdir.join('064.h5'))
+    convertScan(cube.fileList[:5], containerFile).close()
+    container = ScanContainer(containerFile)
+    try:
+        assert container.shape == (5,) + cube.frameShape
+        for i in range(5):
+            np.testing.assert_array_equal(container[i], cube[i])
+    finally:
+        container.close()
+    assert not container.h5.id.valid
+
+    # images read one by one hold no file open
+    cube.close()
+    np.testing.assert_array_equal(cube[0], np.array(Image.open(cube.fileList[0])))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import numpy as np
+from scanIndex import firstFrame, frameNumber, frameRows, indexImageDirectory, missingFrames, naturalKey
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+def testNaturalKeyOrdersNumbersByValue():
+    names = ['S64_10.tif', 'S64_2.tif', 's64_1.TIF', 'S64_100.tif', 'S65_1.tif']
+    assert sorted(names, key=naturalKey) == ['s64_1.TIF', 'S64_2.tif', 'S64_10.tif', 'S64_100.tif', 'S65_1.tif']
+    assert frameNumber('AGBO1_1_S064_00012.tif') == 12 and frameNumber('dark.tif') == -1
+
+
+def testRowsAreCountedFromTheFirstFrame():
+    fromZero = ['S064_%05d.tif' % i for i in range(4)]
+    fromOne = ['S064_%05d.tif' % i for i in range(1, 5)]
+    assert frameRows(fromZero) == frameRows(fromOne) == [0, 1, 2, 3]
+    assert firstFrame(fromOne) == 1 and firstFrame(['dark.tif'] + fromOne) is None
+
+    # frames past the spec data points, or before the first frame, have no row
+    assert frameRows(fromOne, rowCount=3) == [0, 1, 2, -1]
+    assert frameRows(fromOne[1:], rowCount=3, first=1) == [1, 2, -1]
+    assert frameRows(fromOne[:1], rowCount=3, first=2) == [-1]
+    assert frameRows(['b.tif', 'a.tif', 'c.tif'], rowCount=2) == [0, 1, -1]
+
+
+def testFrameTableIsInScanOrder(tmpdir):
+    for i in (10, 9, 1, 3, 2):
+        tmpdir.join('S064_%d.tif' % i).write_binary(b'\0' * (i + 1))
+    tmpdir.join('S064.spec').write('')
+    tmpdir.mkdir('S064_11.tif')
+    table = indexImageDirectory(str(tmpdir))
+    assert list(table['frame']) == [1, 2, 3, 9, 10]
+    assert list(table['row']) == [0, 1, 2, 8, 9]
+    assert list(table['size']) == [2, 3, 4, 10, 11]
+    assert [os.path.basename(path) for path in table['path']] == ['S064_%d.tif' % i for i in (1, 2, 3, 9, 10)]
+    assert np.all(table['mtime'] > 0)
+    assert list(missingFrames(table)) == [4, 5, 6, 7, 8]
+
+
+def testEmptyAndCompleteScansHaveNoMissingFrames(tmpdir):
+    table = indexImageDirectory(str(tmpdir))
+    assert len(table) == 0 and len(missingFrames(table)) == 0
+    for i in range(3):
+        tmpdir.join('S064_%05d.tif' % i).write('')
+    assert len(missingFrames(indexImageDirectory(str(tmpdir)))) == 0
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from areaData import AreaData
+from pixelMask import PixelMask
+from sparseFrame import SparseFrame, compactFrame
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+DROI = (60, 40, 110, 70)
+PROI = (56, 38, 9, 11)
+BROI = (56, 38, 31, 27)
+
+
+def makeFrame(shape=(80, 120), seed=0):
+    """Mostly empty frame with a peak and a module gap of negative pixels."""
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[:shape[0], :shape[1]]
+    img = rng.poisson(0.05 + 300.0 * np.exp(-((x - 56) ** 2 + (y - 38) ** 2) / 10.0)).astype(np.int32)
+    img[60:63, :] = -2
+    return img
+
+
+def integrals(data):
+    return data.areaIntegral() + data.lineIntegral(0, 1)[4:] + data.lineIntegral(1, 2)[4:]
+
+
+def testSparseIntegralsMatchDense():
+    img = makeFrame()
+    sparse = SparseFrame.fromDense(img)
+    data = AreaData(sparse, DROI, PROI, BROI)
+    np.testing.assert_allclose(integrals(data), integrals(AreaData(img, DROI, PROI, BROI)), rtol=1e-12)
+    assert data._back_img is None  # nothing was expanded
+
+
+def testSparseMaskedIntegralsMatchDense():
+    img = makeFrame()
+    pixelMask = PixelMask.fromFrame(img)
+    pixelMask.addRectangle((50, 45, 4, 3))
+    dense = AreaData(img, DROI, PROI, BROI, pixelMask=pixelMask)
+    sparse = AreaData(SparseFrame.fromDense(img), DROI, PROI, BROI, pixelMask=pixelMask)
+    np.testing.assert_allclose(integrals(sparse), integrals(dense), rtol=1e-12)
+
+
+def testSparseFrameRoundTripAndClipping():
+    img = makeFrame()
+    sparse = SparseFrame.fromDense(img)
+    np.testing.assert_array_equal(sparse.toDense(), img)
+    np.testing.assert_array_equal(sparse.crop(-5, 10, 110, 130), img[0:10, 110:120])
+    assert sparse.sum(-5, 10, 110, 130) == img[0:10, 110:120].sum()
+    np.testing.assert_array_equal(sparse.profile(1, 70, 90, 0, 120), img[70:80].sum(1))
+    assert sparse.size(70, 90, -3, 4) == 40
+    assert sparse.sum(100, 120, 0, 10) == 0
+
+
+def testCompactFrameKeepsDenseFrames():
+    img = makeFrame()
+    assert isinstance(compactFrame(img), SparseFrame)
+    full = np.ones((20, 30), dtype=np.int32)
+    assert compactFrame(full) is full
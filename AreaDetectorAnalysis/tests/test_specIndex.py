@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import os
+import pytest
+
+spec = pytest.importorskip('spec2nexus.spec')
+from correctionFiles import isSidecar, sidecarPath
+from specIndex import SpecIndex, findSpecFiles
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+def writeSpecFile(path, scansPerHeader=5, lineEnd="\r\n"):
+    """Spec file with two headers (#E restart) and one repeated scan number."""
+    lines = []
+    number = 0
+    for block, epoch in enumerate((1577836800, 1577900000)):
+        lines += ["#F " + os.path.basename(path), "#E %d" % epoch, "#D Thu Jan 02 00:00:00 2020",
+                  "#C test  User = me", "#O0 %s Theta  Chi  Phi" % ("Two Theta" if block == 0 else "TwoTheta"),
+                  "#O1 Mu  Nu", ""]
+        for k in range(scansPerHeader):
+            number += 1
+            lines += ["#S %d  ascan  th 1 2 3 1" % number, "#D Thu Jan 02 00:00:00 2020", "#T 1  (Seconds)",
+                      "#G0 0 0 0 0", "#G3 1 0 0 0 1 0 0 0 %d" % number, "#Q 1 0 0",
+                      "#P0 %d 2 3 4" % number, "#P1 5 6", "#UE %g" % (8 + 0.1 * number), "#N 3",
+                      "#L th  Ion_Ch_2  Seconds"]
+            lines += ["%g %d 1" % (1 + i * 0.5, 10 * number + i) for i in range(4)]
+            lines.append("")
+    lines += ["#S 3  ascan  th 1 2 3 1", "#D Thu Jan 02 00:00:00 2020", "#N 3", "#L th  Ion_Ch_2  Seconds", "1 1 1", ""]
+    with open(path, 'wb') as f:
+        f.write(lineEnd.join(lines).encode('ascii'))
+
+
+@pytest.mark.parametrize('lineEnd', ["\n", "\r\n"])
+def testScansMatchFullParse(tmpdir, lineEnd):
+    path = str(tmpdir.join('test.spec'))
+    writeSpecFile(path, lineEnd=lineEnd)
+    full = spec.SpecDataFile(path)
+    index = SpecIndex(path)
+    assert index.getMaxScanNumber() == int(full.getMaxScanNumber()) == 10
+    assert index.scanNumbers() == list(range(1, 11)) + [3]
+    for number in ('1', '3', '5', '6', '10'):
+        expected, scan = full.scans[number], index.scan(number)
+        assert scan.raw == expected.raw
+        assert (scan.S, scan.scanNum, scan.scanCmd) == (expected.S, expected.scanNum, expected.scanCmd)
+        assert scan.data == expected.data and scan.L == expected.L
+        assert scan.P == expected.P and scan.G == expected.G
+        assert scan.header.epoch == expected.header.epoch and scan.header.O == expected.header.O
+
+
+def testHeaderLines(tmpdir):
+    path = str(tmpdir.join('test.spec'))
+    writeSpecFile(path)
+    index = SpecIndex(path)
+    assert index.headerLine(2, '#O0') == "#O0 Two Theta Theta  Chi  Phi"
+    assert index.headerLine(7, '#O0') == "#O0 TwoTheta Theta  Chi  Phi"
+    assert index.headerLine(7, '#O5') is None
+    with pytest.raises(KeyError):
+        index.scan(42)
+
+
+def testIndexIsRebuiltWhenTheFileChanges(tmpdir):
+    path = str(tmpdir.join('test.spec'))
+    writeSpecFile(path, scansPerHeader=2)
+    assert SpecIndex(path).getMaxScanNumber() == 4
+    first = sidecarPath(path)
+    assert os.path.isfile(first)
+
+    writeSpecFile(path, scansPerHeader=3)
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+    assert SpecIndex(path).getMaxScanNumber() == 6
+    assert not os.path.isfile(first) and os.path.isfile(sidecarPath(path))
+
+
+def testSidecarsAreNotTakenForSpecFiles(tmpdir):
+    path = str(tmpdir.join('zz.spec'))
+    writeSpecFile(path)
+    SpecIndex(path)
+    tmpdir.join('zz.spec.1-2.npy.123.tmp').write('')
+    tmpdir.join('notes.txt').write('beamtime notes\n')
+    tmpdir.mkdir('64')
+    assert findSpecFiles(str(tmpdir)) == [path]
+    assert isSidecar(sidecarPath(path)) and not isSidecar(path)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+"""
+Copyright (c) UChicago Argonne, LLC. All rights reserved.
+See LICENSE file.
+"""
+# ---------------------------------------------------------------------------------------------------------------------#
+from __future__ import unicode_literals
+import numpy as np
+from areaData import AreaData
+from pixelMask import PixelMask
+from summedAreaTable import SummedAreaTable, boxSums, clipBoxes, stackTables
+
+# ---------------------------------------------------------------------------------------------------------------------#
+
+def makeFrame(shape=(60, 90), seed=0):
+    return np.random.RandomState(seed).poisson(30.0, shape).astype(np.int32)
+
+
+def randomBoxes(shape, count=200, seed=1):
+    """Rectangles partly outside the image and empty ones included."""
+    rng = np.random.RandomState(seed)
+    y = np.sort(rng.randint(-5, shape[0] + 5, (count, 2)), 1)
+    x = np.sort(rng.randint(-5, shape[1] + 5, (count, 2)), 1)
+    return y[:, 0], y[:, 1], x[:, 0], x[:, 1]
+
+
+def testSumProfileAndSizeMatchSlices():
+    img = makeFrame()
+    sat = SummedAreaTable(img)
+    for y0, y1, x0, x1 in zip(*randomBoxes(img.shape)):
+        y0, x0 = max(y0, 0), max(x0, 0)
+        box = img[y0:y1, x0:x1]
+        assert sat.sum(y0, y1, x0, x1) == box.sum()
+        assert sat.size(y0, y1, x0, x1) == box.size
+        np.testing.assert_array_equal(sat.profile(0, y0, y1, x0, x1), box.sum(0))
+        np.testing.assert_array_equal(sat.profile(1, y0, y1, x0, x1), box.sum(1))
+
+
+def testBoxSumsOfStacks():
+    frames = np.array([makeFrame(seed=i) for i in range(4)])
+    y0, y1, x0, x1 = clipBoxes(frames.shape[1:], *randomBoxes(frames.shape[1:]))
+    sums = boxSums(stackTables(frames), y0, y1, x0, x1)
+    expected = [[f[a:b, c:d].sum() for a, b, c, d in zip(y0, y1, x0, x1)] for f in frames]
+    np.testing.assert_array_equal(sums, expected)
+    np.testing.assert_array_equal(SummedAreaTable(frames[2]).sums(*randomBoxes(frames.shape[1:])), expected[2])
+
+
+def testMaskedTableLeavesMaskedPixelsOut():
+    img = makeFrame()
+    pixelMask = PixelMask(img.shape)
+    pixelMask.addRectangle((40, 30, 6, 4))
+    sat = SummedAreaTable(img, pixelMask)
+    assert sat.sum(0, 60, 0, 90) == img[~pixelMask.masked].sum()
+
+
+def testSatAreaIntegralMatchesAreaData():
+    img = makeFrame()
+    droi, proi, broi = (45, 30, 80, 50), (40, 31, 8, 6), (41, 30, 24, 20)
+    direct = AreaData(img, droi, proi, broi)
+    fromTable = AreaData(img, droi, proi, broi, sat=SummedAreaTable(img))
+    np.testing.assert_allclose(fromTable.areaIntegral(), direct.areaIntegral(), rtol=1e-12)
+    np.testing.assert_allclose(fromTable.lineIntegral(0, 1)[4:], direct.lineIntegral(0, 1)[4:], rtol=1e-12)
+    np.testing.assert_allclose(fromTable.lineIntegral(1, 2)[4:], direct.lineIntegral(1, 2)[4:], rtol=1e-12)